@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from linear_equations_solver import LinearEquationSolver as LES
+
+#Streaming batch solver
+#Reads systems as JSON Lines ({"A": [[...]], "B": [[...]]}) or .npz (stacked A and B), solves them on a
+#process pool with a bounded number of chunks in flight, and writes one JSON line per system in input order
+#Run: python batch_solve.py systems.jsonl -j 64 > results.jsonl
+
+EPS = 1e-10                                                                     #Floor of the scaled zero threshold, both paths use it
+
+def read_jsonl(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            d = json.loads(line)
+            yield d.get("id"), d["A"], d.get("B")
+
+def _npz_header(f):
+
+    #shape, fortran, dtype of a .npy stream, leaves f at the first data byte
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+def _npz_blocks(z, name, block, single):
+
+    #Leading-axis blocks of one .npz member read straight off the zip stream, compressed or not
+    #Only `block` systems are decoded at a time, the stack itself is never loaded
+
+    with z.open(name + ".npy") as f:
+        shape, fortran, dtype = _npz_header(f)
+        if fortran or dtype.hasobject:
+            raise ValueError(f"{name} must be a C-ordered numeric array to be streamed")
+
+        if single:                                                              #One system, treated as a stack of one
+            shape = (1,) + shape
+        per = dtype.itemsize * int(np.prod(shape[1:]))
+
+        for a in range(0, shape[0], block):
+            n = min(block, shape[0] - a)
+            yield np.frombuffer(f.read(n * per), dtype = dtype).reshape((n,) + shape[1:])
+
+def read_npz(path, block = 1024):
+
+    #A is (N, m, n) or (m, n), B is (N, m), (N, m, k) or absent
+
+    with zipfile.ZipFile(path) as z:
+        with z.open("A.npy") as f:
+            single = len(_npz_header(f)[0]) == 2
+
+        B_blocks = _npz_blocks(z, "B", block, single) if "B.npy" in z.namelist() else None
+        for A in _npz_blocks(z, "A", block, single):
+            B = next(B_blocks) if B_blocks is not None else None
+            for s in range(len(A)):
+                yield None, A[s], B[s] if B is not None else None
+
+def read_systems(path, fmt = "auto"):
+    if fmt == "auto":
+        fmt = "npz" if path.endswith(".npz") else "jsonl"
+    if fmt == "npz":
+        yield from read_npz(path)
+    elif path == "-":
+        yield from read_jsonl(sys.stdin)
+    else:
+        with open(path) as f:
+            yield from read_jsonl(f)
+
+def _clean(X):
+
+    #NaN marks an inconsistent column, JSON has null for that
+
+    return [[None if v != v else v for v in row] for row in np.asarray(X, dtype = float).tolist()]
+
+def _result(key, x_p, nullspace, rank, consistent):
+    return {
+        "id": key,
+        "status": "ok" if all(consistent) else "inconsistent",
+        "rank": int(rank),
+        "consistent": [bool(c) for c in consistent],
+        "x_p": _clean(x_p),
+        "nullspace": _clean(nullspace),
+    }
+
+def _solve_one(key, A, B):
+    try:
+        o = LES(A, B)
+        o._factor(EPS)
+        x_p, N = o._soln_extract(EPS)                                              #Per-column status, no ColumnSpaceError
+        if isinstance(N, int):
+            N = np.zeros((o.A.shape[1], 0))
+        consistent = o.consistent if o.B is not None else [True]
+        return _result(key, x_p, N, len(o._pivot_cols), consistent)
+    except Exception as e:
+        return {"id": key, "status": "error", "error": str(e)}
+
+def solve_chunk(chunk):
+
+    #One worker task, systems of one shape share a single vectorized elimination
+    #solve_batch scales the threshold per system like LES does, so a result never depends on its chunk
+
+    keys = [key for key, _, _ in chunk]
+    try:
+        A = np.array([np.asarray(a, dtype = float) for _, a, _ in chunk])
+        Bs = [b for _, _, b in chunk]
+        B = None if all(b is None for b in Bs) else np.array([np.asarray(b, dtype = float) for b in Bs])
+    except (ValueError, TypeError):                                             #Ragged shapes or missing B in some systems
+        return [_solve_one(*system) for system in chunk]
+
+    if A.ndim != 3 or (B is not None and B.ndim not in (2, 3)):
+        return [_solve_one(*system) for system in chunk]
+
+    if B is not None and B.ndim == 2:
+        B = B[:, :, None]
+
+    x_p, nullspace, free, rank, consistent = LES.solve_batch(A, B, EPS)
+
+    out = []
+    for s, key in enumerate(keys):
+        cons = consistent[s] if B is not None else [True]
+        x = x_p[s] if B is not None else np.zeros((A.shape[2], 1))
+        out.append(_result(key, x, nullspace[s][:, free[s]], rank[s], cons))
+    return out
+
+def chunks(systems, size):
+    it = iter(systems)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run(systems, out, workers, chunk_size, max_pending):
+
+    #At most max_pending chunks are queued or running, results are written in submission order
+
+    index = 0
+
+    def write(results):
+        nonlocal index
+        for r in results:
+            if r["id"] is None:
+                r["id"] = index
+            out.write(json.dumps(r) + "\n")
+            index += 1
+
+    if workers <= 1:
+        for chunk in chunks(systems, chunk_size):
+            write(solve_chunk(chunk))
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunks(systems, chunk_size):
+            if len(pending) >= max_pending:
+                write(pending.popleft().result())
+            pending.append(pool.submit(solve_chunk, chunk))
+        while pending:
+            write(pending.popleft().result())
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Solve a stream of linear systems in parallel")
+    parser.add_argument("input", nargs = "?", default = "-", help = "JSON Lines file, .npz archive, or - for stdin")
+    parser.add_argument("-o", "--output", default = "-")
+    parser.add_argument("-f", "--format", default = "auto", choices = ["auto", "jsonl", "npz"])
+    parser.add_argument("-j", "--workers", type = int, default = os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type = int, default = 256)
+    parser.add_argument("--max-pending", type = int, default = None, help = "chunks in flight, default 2 per worker")
+    args = parser.parse_args(argv)
+
+    max_pending = args.max_pending or 2 * args.workers
+    systems = read_systems(args.input, args.format)
+
+    if args.output == "-":
+        run(systems, sys.stdout, args.workers, args.chunk_size, max_pending)
+    else:
+        with open(args.output, "w") as out:
+            run(systems, out, args.workers, args.chunk_size, max_pending)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from sympy import Matrix
+from linear_equations_solver import LinearEquationSolver as LES
+from linear_equations_solver import ColumnSpaceError
+from sparse_solver import SparseLinearEquationSolver as SLES
+from eigen import Eigen
+
+#Benchmark harness for the solver and eigen engines
+#Run: python benchmark.py --sizes 3 10 50 200 --output bench.json [--compare old.json]
+
+SIZES = [3, 10, 50, 200, 500, 1000, 2000]
+KINDS = ["square", "tall", "wide", "rank_deficient", "inconsistent", "sparse", "integer"]
+TARGETS = ["solve", "_rref", "_find_nullspace", "eigen_values", "eigen_vectors", "sympy_rref"]
+
+MAX_EXACT = 100                                                                 #Rational arithmetic grows fast beyond this
+MAX_SYMBOLIC = 6                                                                #sympy.solve on the characteristic polynomial
+MAX_SPARSE_DENSE = 500                                                          #Dense reference for the sparse kind
+
+def make_system(kind, n, rng):
+
+    #Returns A, B for one benchmark case
+
+    if kind == "square":
+        A = rng.standard_normal((n, n))
+        return A, rng.standard_normal((n, 1))
+
+    if kind == "tall":
+        A = rng.standard_normal((2 * n, n))
+        return A, A @ rng.standard_normal((n, 1))
+
+    if kind == "wide":
+        A = rng.standard_normal((max(1, n // 2), n))
+        return A, rng.standard_normal((A.shape[0], 1))
+
+    if kind in ("rank_deficient", "inconsistent"):
+        r = max(1, n // 2)
+        A = rng.standard_normal((n, r)) @ rng.standard_normal((r, n))
+        if kind == "inconsistent":
+            return A, rng.standard_normal((n, 1))
+        return A, A @ rng.standard_normal((n, 1))
+
+    if kind == "sparse":
+        A = rng.standard_normal((n, n)) * (rng.random((n, n)) < min(1.0, 5.0 / n))
+        A[np.arange(n), np.arange(n)] += 4                                      #Keep it nonsingular
+        return A, rng.standard_normal((n, 1))
+
+    if kind == "integer":
+        A = rng.integers(-9, 10, (n, n))
+        A[:, n // 2] = A[:, 0] + A[:, -1]
+        return A, A @ rng.integers(-3, 4, (n, 1))
+
+    raise ValueError(f"Unknown kind {kind}")
+
+def make_solver(kind, A, B):
+    if kind == "integer":
+        return LES(A, B, exact = True)
+    if kind == "sparse" and A.shape[0] > MAX_SPARSE_DENSE:
+        r, c = np.nonzero(A)
+        return SLES((r, c, A[r, c], A.shape), B)
+    return LES(A, B)
+
+def accuracy(target, kind, A, B, result):
+
+    #Errors against numpy.linalg, smaller is better
+
+    A = np.asarray(A, dtype = float)
+    B = np.asarray(B, dtype = float)
+
+    if target == "solve":
+        x_p, N = result
+        x_p = np.asarray(x_p, dtype = float)
+        if np.isnan(x_p).all():
+            lsq = np.linalg.lstsq(A, B, rcond = None)[0]
+            return {"inconsistent_detected": bool(np.linalg.norm(A @ lsq - B) > 1e-8 * np.linalg.norm(B))}
+        out = {"residual": float(np.linalg.norm(A @ x_p - B) / max(np.linalg.norm(B), 1e-300))}
+        k = 0 if isinstance(N, int) else np.asarray(N).shape[1]
+        out["nullity_error"] = int(abs(k - (A.shape[1] - np.linalg.matrix_rank(A))))
+        return out
+
+    if target == "_rref":
+        R, pivots = result
+        return {"rank_error": int(abs(len(pivots) - np.linalg.matrix_rank(A)))}
+
+    if target == "_find_nullspace":
+        N = np.asarray(result, dtype = float)
+        out = {"nullity_error": int(abs(N.shape[1] - (A.shape[1] - np.linalg.matrix_rank(A))))}
+        if N.size:
+            out["AN"] = float(np.linalg.norm(A @ N) / max(np.linalg.norm(A), 1e-300))
+        return out
+
+    if target == "eigen_values":
+        ref = np.sort_complex(np.linalg.eigvals(A))
+        got = np.sort_complex(np.array([complex(v) for v in np.ravel(result)]))
+        if len(got) != len(ref):                                                #Symbolic values are distinct roots
+            return {"distinct": len(got)}
+        return {"max_abs_error": float(np.max(np.abs(got - ref)))}
+
+    return {}
+
+def run_target(target, kind, n, A, B):
+
+    #Returns a callable for one measurement, None when the combination is skipped
+
+    if target in ("eigen_values", "eigen_vectors"):
+        if kind not in ("square", "integer", "rank_deficient"):
+            return None
+        mode = "symbolic" if kind == "integer" else "numeric"
+        if mode == "symbolic" and n > MAX_SYMBOLIC:
+            return None
+
+        def fn():
+            e = Eigen(A.tolist() if mode == "symbolic" else A, mode = mode)
+            values = e.values()
+            return values if target == "eigen_values" else e.vectors()
+        return fn
+
+    if kind == "integer" and n > MAX_EXACT:
+        return None
+
+    if target == "sympy_rref":                                                  #Reference for the exact engine
+        if kind != "integer":
+            return None
+        return lambda: Matrix(np.column_stack((A, B)).tolist()).rref(pivots = False)
+
+    if target == "solve":
+        def fn():
+            try:
+                return make_solver(kind, A, B).solve()
+            except ColumnSpaceError:
+                return np.full((A.shape[1], 1), np.nan), 0
+        return fn
+
+    if kind == "sparse" and n > MAX_SPARSE_DENSE:
+        return None
+
+    if target == "_rref":
+        return lambda: make_solver(kind, A, B)._rref()
+
+    if target == "_find_nullspace":
+        return lambda: make_solver(kind, A, None)._find_nullspace()
+
+    return None
+
+def measure(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t)
+
+    tracemalloc.start()                                                         #Separate run, tracing slows allocation
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(times), float(np.median(times)), peak, result
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output = True, text = True,
+                             cwd = os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run(sizes, kinds, targets, repeat, seed, budget):
+    results = []
+    over_budget = set()
+    rng = np.random.default_rng(seed)
+
+    for kind in kinds:
+        for n in sizes:
+            A, B = make_system(kind, n, rng)
+            for target in targets:
+                if (kind, target) in over_budget:
+                    continue
+                fn = run_target(target, kind, n, A, B)
+                if fn is None:
+                    continue
+
+                reps = repeat if n <= 200 else 1
+                best, median, peak, result = measure(fn, reps)
+                row = {"kind": kind, "n": n, "shape": list(A.shape), "target": target,
+                       "best_s": best, "median_s": median, "peak_bytes": peak, "repeat": reps}
+                row.update(accuracy(target, kind, A, B, result))
+                results.append(row)
+
+                print(f"{kind:>15} {n:>5} {target:>16} {best * 1e3:10.2f} ms {peak / 2 ** 20:9.2f} MiB", flush = True)
+
+                if budget and best > budget:                                    #Larger sizes would only take longer
+                    over_budget.add((kind, target))
+
+    return results
+
+def compare(old, new):
+
+    #Ratio of best times per case, above 1 is slower than the old run
+
+    key = lambda r: (r["kind"], r["n"], r["target"])
+    old = {key(r): r for r in old["results"]}
+    for r in new["results"]:
+        o = old.get(key(r))
+        if o:
+            print(f"{r['kind']:>15} {r['n']:>5} {r['target']:>16} {r['best_s'] / o['best_s']:7.2f}x")
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the linear equations solver and eigen engines")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES)
+    parser.add_argument("--kinds", nargs = "+", default = KINDS, choices = KINDS)
+    parser.add_argument("--targets", nargs = "+", default = TARGETS, choices = TARGETS)
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--budget", type = float, default = 60.0,
+                        help = "skip the remaining sizes of a case once one run exceeds this many seconds")
+    parser.add_argument("--output", default = "bench.json")
+    parser.add_argument("--compare", help = "earlier JSON output to compare against")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": run(sorted(args.sizes), args.kinds, args.targets, args.repeat, args.seed, args.budget),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent = 1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+#Content-addressed result cache for LinearEquationSolver and Eigen
+#Keys hash the array bytes, shape and dtype with the tolerance, so equal systems from different callers share one entry
+
+COUNTERS = ["hits", "misses", "evictions", "disk_hits", "disk_writes"]
+
+def _nbytes(value):
+
+    #Approximate size of a cached value, arrays by their buffers
+
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(x) for x in value.flat)
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+class ResultCache:
+
+    #LRU over max_bytes of results, directory adds a pickle per entry that outlives the process
+    #One cache can be shared by many solvers and threads
+
+    def __init__(self, max_bytes = 1 << 28, directory = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.nbytes = 0
+        self.counters = {name: 0 for name in COUNTERS}
+        self._entries = OrderedDict()                                           #key -> (value, size), oldest first
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    @staticmethod
+    def key(kind, *parts):
+
+        #blake2b over kind and every part, arrays contribute dtype, shape and raw bytes
+
+        h = hashlib.blake2b(kind.encode(), digest_size = 16)
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                h.update(f"{part.dtype.str}{part.shape}".encode())
+                if part.dtype == object:                                        #Fractions or sympy entries, no raw buffer
+                    h.update(repr(part.tolist()).encode())
+                else:
+                    h.update(np.ascontiguousarray(part).data)
+            else:
+                h.update(repr(part).encode())
+            h.update(b"|")
+
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return self._entries[key][0]
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):                 #Torn or foreign file, treat as a miss
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.counters["hits"] += 1
+                    self.counters["disk_hits"] += 1
+                self._insert(key, value)
+                return value
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        self._insert(key, value)
+
+        if self.directory is not None:                                          #Write then rename, readers never see half a file
+            tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+            with self._lock:
+                self.counters["disk_writes"] += 1
+
+    def _insert(self, key, value):
+        size = _nbytes(value)
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:                                           #Would evict everything, keep it on disk only
+                return
+
+            self._entries[key] = (value, size)
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes:
+                _, (_, old) = self._entries.popitem(last = False)
+                self.nbytes -= old
+                self.counters["evictions"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+
+        #Memory tier only, the disk tier is left for the next process
+
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def as_dict(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "counters": dict(self.counters),
+        }
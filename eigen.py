@@ -1,34 +1,201 @@
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from linear_equations_solver import LinearEquationSolver as LES
-from sympy import symbols, Eq, Matrix, eye, prod, solve
+from fractions import Fraction
+from sympy import symbols, Eq, Matrix, eye, prod, solve, Rational, expand
+
+def _nullspaces(stack, eps):
+
+    #Basis vectors of each matrix in the stack, module level so a process pool can pickle it
+
+    _, nullspace, free, _, _ = LES.solve_batch(stack, eps = eps)
+    return [list(nullspace[s][:, free[s]].T) for s in range(len(stack))]
 
 class Eigen():
-    def __init__(self, M):
-        self.M = Matrix(M)
+    def __init__(self, M, mode = "symbolic", symmetric = None, cache = None):
+        self.mode = mode                                                        #"symbolic" for small exact M, "numeric" for floats
+        self.cache = cache                                                      #ResultCache, shared with the solvers if wanted
+        if mode == "numeric":
+            self.M = np.array(M, dtype = float)
+            if symmetric is None:
+                symmetric = bool(np.array_equal(self.M, self.M.T))              #Exact only, eigh reads one triangle
+            self.symmetric = symmetric
+        elif mode == "symbolic":
+            self.M = Matrix(M)
+        else:
+            raise ValueError(f"Unknown mode {mode}")
         self.l = symbols("l")
         self.C = Matrix.zeros(self.M.shape[0])
         self.eigenvalues = []
         self.eigenvectors = []
+        self._charpoly = None
+
+    def _cache_key(self, kind):
+        if self.mode == "numeric":
+            return self.cache.key(kind, self.M, self.symmetric)
+        return self.cache.key(kind, repr(self.M.tolist()))
+
+    def charpoly(self):
+
+        #det(l*I - M) from the division-free Berkowitz algorithm, computed once per matrix
+
+        if self._charpoly is not None:
+            return self._charpoly
+
+        entries = self.M.tolist() if self.mode == "symbolic" else Matrix(self.M).tolist()
+
+        if all(x.is_Rational for row in entries for x in row):                  #Machine rationals, no expression swell
+            rows = [[Fraction(int(x.p), int(x.q)) for x in row] for row in entries]
+            coeffs = [Rational(c.numerator, c.denominator) for c in Eigen.berkowitz(rows)]
+        else:
+            coeffs = [expand(c) for c in Eigen.berkowitz(entries)]
+
+        n = len(coeffs) - 1
+        self._charpoly = sum(c * self.l ** (n - i) for i, c in enumerate(coeffs))
+
+        return self._charpoly
 
     def values(self):
 
+        if self.mode == "numeric":
+            self._numeric()
+            return self.eigenvalues
+
         self.C = self.M - self.l * eye(self.M.shape[0])
-        char_eqn = Eigen.det(self.C)
+
+        if self.cache is not None:
+            key = self._cache_key("eigen_values")
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.eigenvalues = list(cached)
+                return self.eigenvalues
+
+        char_eqn = self.charpoly()
 
         self.eigenvalues = solve(char_eqn, self.l)
 
+        if self.cache is not None:
+            self.cache.put(key, list(self.eigenvalues))
+
         return self.eigenvalues
     
-    def vectors(self):
-        for ev in self.eigenvalues:
-            ev_matrix = self.C.subs(self.l, ev)
+    def vectors(self, n_workers = None):
+
+        #Nullspaces of M - l*I for every eigenvalue from one batched elimination
+        #n_workers splits the eigenvalues over a process pool
+
+        if self.mode == "numeric":
+            self._numeric()
+            return self.eigenvectors
+
+        if not self.eigenvalues:
+            self.values()
+
+        if len(self.eigenvectors) == len(self.eigenvalues):                     #Already extracted for these eigenvalues
+            return self.eigenvectors
+
+        if self.cache is not None:
+            key = self._cache_key("eigen_vectors")
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.eigenvectors = [[np.array(v) for v in basis] for basis in cached]
+                return self.eigenvectors
+
+        M = np.array(self.M.evalf().tolist(), dtype = complex)
+        evs = np.array([complex(ev.evalf()) for ev in self.eigenvalues])
+        if not np.iscomplexobj(evs) or not np.any(evs.imag):
+            M, evs = M.real, evs.real
+
+        stack = M[None, :, :] - evs[:, None, None] * np.eye(M.shape[0])         #One M - l*I per eigenvalue
+        eps = 1e-10 * max(1.0, np.abs(M).max())
 
-            basis = LES(np.array(ev_matrix.tolist(), dtype = float))._find_nullspace()
+        if n_workers and len(evs) > 1:
+            chunks = np.array_split(stack, min(n_workers, len(evs)))
+            with ProcessPoolExecutor(n_workers) as pool:
+                parts = list(pool.map(_nullspaces, chunks, [eps] * len(chunks)))
+            self.eigenvectors = [basis for part in parts for basis in part]
+        else:
+            self.eigenvectors = _nullspaces(stack, eps)
 
-            self.eigenvectors.append(basis)
+        if self.cache is not None:                                              #Copies, callers may modify their result
+            self.cache.put(key, [[np.array(v) for v in basis] for basis in self.eigenvectors])
 
         return self.eigenvectors
 
+    def _numeric(self):
+
+        #LAPACK through numpy, Hessenberg reduction + shifted QR (geev) or tridiagonal QR (syevd)
+        #Eigenvectors are the columns of self.eigenvectors
+
+        if len(self.eigenvectors):
+            return
+
+        if self.cache is not None:
+            key = self._cache_key("eigen_numeric")
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.eigenvalues, self.eigenvectors = np.array(cached[0]), np.array(cached[1])
+                return
+
+        if self.symmetric:
+            self.eigenvalues, self.eigenvectors = np.linalg.eigh(self.M)
+        else:
+            self.eigenvalues, self.eigenvectors = np.linalg.eig(self.M)
+
+        if self.cache is not None:
+            self.cache.put(key, (self.eigenvalues.copy(), self.eigenvectors.copy()))
+
+    def top(self, k = 1, tol=1e-10, maxiter=1000, seed=0):
+
+        #k eigenvalues of largest magnitude by subspace (block power) iteration with Rayleigh-Ritz
+        #Only needs products with M, so it stays cheap when k is much smaller than n
+
+        M = np.array(self.M, dtype = float) if self.mode == "symbolic" else self.M
+        n = M.shape[0]
+        k = min(k, n)
+
+        Q, _ = np.linalg.qr(np.random.default_rng(seed).standard_normal((n, k)))
+        scale = np.linalg.norm(M)
+
+        for _ in range(maxiter):
+            MQ = M @ Q
+            H = Q.T @ MQ
+            vals, W = np.linalg.eigh(H) if self.mode == "numeric" and self.symmetric else np.linalg.eig(H)
+            order = np.argsort(-np.abs(vals))
+            vals, W = vals[order], W[:, order]
+
+            V = Q @ W
+            if np.linalg.norm(MQ @ W - V * vals) <= tol * scale:                #Ritz pair residual
+                break
+
+            Q, _ = np.linalg.qr(MQ)
+
+        return vals, V
+
+    @staticmethod
+    def berkowitz(A):
+
+        #Coefficients [1, c1, ..., cn] of det(x*I - A), A a square list of lists
+        #Grows the leading submatrix one row/column at a time, p_k+1 = T p_k with T lower Toeplitz
+        #Only additions and multiplications, O(n^4) ring operations
+
+        n = len(A)
+        p = [1]
+
+        for k in range(n):
+            r = A[k][:k]
+            c = [A[i][k] for i in range(k)]
+
+            t = [1, -A[k][k]]
+            v = c
+            for _ in range(k):                                                  #-r A^j c for j = 0 .. k-1
+                t.append(-sum(x * y for x, y in zip(r, v)))
+                v = [sum(A[i][j] * v[j] for j in range(k)) for i in range(k)]
+
+            p = [sum(t[i - j] * p[j] for j in range(len(p)) if 0 <= i - j < len(t)) for i in range(k + 2)]
+
+        return p
+
     @staticmethod
     def det(A):
         pivot_list = []
@@ -0,0 +1,306 @@
+import numpy as np
+
+#Iterative Krylov solvers for large, well-conditioned, full-rank systems
+#A may be a dense array, a scipy.sparse matrix, an object with matvec/rmatvec/shape, or a plain matvec callable
+
+def is_sparse(A):
+    return hasattr(A, "tocsr") and hasattr(A, "nnz")
+
+def is_operator(A):
+
+    #True for anything that is not a dense array, these stay unmaterialized
+
+    return is_sparse(A) or callable(A) or hasattr(A, "matvec")
+
+def _operator(A, n = None):
+
+    #Returns matvec, rmatvec and shape for any supported form of A
+
+    if callable(A) and not hasattr(A, "matvec"):                               #Bare callable, assumed square
+        return A, None, (n, n)
+
+    if hasattr(A, "matvec"):
+        rmatvec = getattr(A, "rmatvec", None)
+        return A.matvec, rmatvec, tuple(A.shape)
+
+    if is_sparse(A):
+        A = A.tocsr()
+        At = A.T.tocsr()
+        return (lambda x: A @ x), (lambda x: At @ x), A.shape
+
+    A = np.asarray(A, dtype = float)
+    return (lambda x: A @ x), (lambda x: A.T @ x), A.shape
+
+def _rows(A):
+
+    #Row-wise dict of nonzeros for an explicit A
+
+    if is_sparse(A):
+        A = A.tocsr()
+        rows = []
+        for i in range(A.shape[0]):
+            lo, hi = A.indptr[i], A.indptr[i + 1]
+            rows.append(dict(zip(A.indices[lo:hi].tolist(), A.data[lo:hi].tolist())))
+        return rows
+
+    if callable(A) or hasattr(A, "matvec"):
+        raise ValueError("Preconditioner needs an explicit A, not a matvec")
+
+    A = np.asarray(A, dtype = float)
+    return [{j: row[j] for j in np.nonzero(row)[0].tolist()} for row in A]
+
+def jacobi(A):
+
+    #Jacobi preconditioner, returns psolve(r) = D^-1 r
+
+    if is_sparse(A):
+        d = np.asarray(A.diagonal(), dtype = float)
+    elif callable(A) or hasattr(A, "matvec"):
+        raise ValueError("Preconditioner needs an explicit A, not a matvec")
+    else:
+        d = np.diag(np.asarray(A, dtype = float)).copy()
+
+    d[d == 0] = 1
+    return lambda r: r / d
+
+def ilu0(A):
+
+    #Incomplete LU with zero fill-in, returns psolve(r) = (LU)^-1 r
+
+    rows = _rows(A)
+    n = len(rows)
+
+    for i in range(1, n):
+        row = rows[i]
+        for k in sorted(j for j in row if j < i):
+            pivot = rows[k].get(k, 0.0)
+            if pivot == 0:
+                raise ValueError(f"ILU(0) breakdown, zero pivot in row {k}")
+            row[k] /= pivot
+            lik = row[k]
+            for j, v in rows[k].items():
+                if j > k and j in row:                                          #Updates stay inside the pattern of A
+                    row[j] -= lik * v
+
+    lower = [[(j, v) for j, v in row.items() if j < i] for i, row in enumerate(rows)]
+    upper = [[(j, v) for j, v in row.items() if j > i] for i, row in enumerate(rows)]
+    diag = np.array([row.get(i, 1.0) for i, row in enumerate(rows)])
+
+    def psolve(r):
+        y = np.array(r, dtype = float)
+        for i in range(n):
+            for j, v in lower[i]:
+                y[i] -= v * y[j]
+        for i in range(n - 1, -1, -1):
+            for j, v in upper[i]:
+                y[i] -= v * y[j]
+            y[i] /= diag[i]
+        return y
+
+    return psolve
+
+def cg(matvec, b, tol=1e-8, maxiter=None, psolve=None):
+
+    #Preconditioned conjugate gradients, A must be symmetric positive definite
+
+    n = len(b)
+    maxiter = maxiter or 10 * n
+    psolve = psolve or (lambda r: r)
+
+    x = np.zeros(n)
+    r = b.copy()
+    z = psolve(r)
+    p = z.copy()
+    rz = r @ z
+
+    bnorm = np.linalg.norm(b) or 1.0
+    history = [np.linalg.norm(r) / bnorm]
+
+    for _ in range(maxiter):
+        if history[-1] <= tol:
+            return x, history, True
+
+        Ap = matvec(p)
+        alpha = rz / (p @ Ap)
+        x += alpha * p
+        r -= alpha * Ap
+        history.append(np.linalg.norm(r) / bnorm)
+
+        z = psolve(r)
+        rz_new = r @ z
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+
+    return x, history, history[-1] <= tol
+
+def gmres(matvec, b, tol=1e-8, maxiter=None, psolve=None, restart=30):
+
+    #Restarted GMRES with right preconditioning, Givens rotations on the Hessenberg matrix
+
+    n = len(b)
+    maxiter = maxiter or 10 * n
+    psolve = psolve or (lambda r: r)
+    restart = min(restart, n)
+
+    x = np.zeros(n)
+    bnorm = np.linalg.norm(b) or 1.0
+    r = b - matvec(x)
+    history = [np.linalg.norm(r) / bnorm]
+    it = 0
+
+    while it < maxiter and history[-1] > tol:
+        beta = np.linalg.norm(r)
+        V = np.zeros((restart + 1, n))
+        H = np.zeros((restart + 1, restart))
+        cs = np.zeros(restart)
+        sn = np.zeros(restart)
+        g = np.zeros(restart + 1)
+        g[0] = beta
+        V[0] = r / beta
+
+        k = 0
+        while k < restart and it < maxiter:
+            w = matvec(psolve(V[k]))
+            for i in range(k + 1):                                              #Modified Gram-Schmidt
+                H[i, k] = w @ V[i]
+                w -= H[i, k] * V[i]
+            H[k + 1, k] = np.linalg.norm(w)
+            if H[k + 1, k] > 0:
+                V[k + 1] = w / H[k + 1, k]
+
+            for i in range(k):
+                H[i, k], H[i + 1, k] = cs[i] * H[i, k] + sn[i] * H[i + 1, k], -sn[i] * H[i, k] + cs[i] * H[i + 1, k]
+            d = np.hypot(H[k, k], H[k + 1, k])
+            cs[k], sn[k] = (H[k, k] / d, H[k + 1, k] / d) if d > 0 else (1.0, 0.0)
+            H[k, k] = d
+            H[k + 1, k] = 0
+            g[k + 1] = -sn[k] * g[k]
+            g[k] = cs[k] * g[k]
+
+            k += 1
+            it += 1
+            history.append(abs(g[k]) / bnorm)
+            if history[-1] <= tol:
+                break
+
+        y = np.zeros(k)
+        for i in range(k - 1, -1, -1):
+            y[i] = (g[i] - H[i, i + 1:k] @ y[i + 1:]) / H[i, i]
+        x += psolve(V[:k].T @ y)
+        r = b - matvec(x)
+        history[-1] = np.linalg.norm(r) / bnorm                                 #True residual at each restart
+
+    return x, history, history[-1] <= tol
+
+def bicgstab(matvec, b, tol=1e-8, maxiter=None, psolve=None):
+
+    #BiCGSTAB with right preconditioning
+
+    n = len(b)
+    maxiter = maxiter or 10 * n
+    psolve = psolve or (lambda r: r)
+
+    x = np.zeros(n)
+    r = b.copy()
+    r0 = r.copy()
+    rho = alpha = omega = 1.0
+    v = np.zeros(n)
+    p = np.zeros(n)
+
+    bnorm = np.linalg.norm(b) or 1.0
+    history = [np.linalg.norm(r) / bnorm]
+
+    for _ in range(maxiter):
+        if history[-1] <= tol:
+            return x, history, True
+
+        rho_new = r0 @ r
+        if rho_new == 0:
+            break
+        beta = (rho_new / rho) * (alpha / omega)
+        rho = rho_new
+
+        p = r + beta * (p - omega * v)
+        ph = psolve(p)
+        v = matvec(ph)
+        alpha = rho / (r0 @ v)
+        s = r - alpha * v
+
+        if np.linalg.norm(s) / bnorm <= tol:
+            x += alpha * ph
+            history.append(np.linalg.norm(s) / bnorm)
+            return x, history, True
+
+        sh = psolve(s)
+        t = matvec(sh)
+        omega = (t @ s) / (t @ t)
+        x += alpha * ph + omega * sh
+        r = s - omega * t
+        history.append(np.linalg.norm(r) / bnorm)
+
+        if omega == 0:
+            break
+
+    return x, history, history[-1] <= tol
+
+def lsqr(matvec, rmatvec, b, n, tol=1e-8, maxiter=None):
+
+    #LSQR (Paige & Saunders) for rectangular systems, least-squares solution when B is not in C(A)
+    #history holds the normal-equation residual ||A^T r|| / (||A|| ||r||) estimate
+
+    if rmatvec is None:
+        raise ValueError("LSQR needs A^T x, pass an operator with rmatvec")
+
+    maxiter = maxiter or 10 * n
+
+    x = np.zeros(n)
+    u = b.copy()
+    beta = np.linalg.norm(u)
+    if beta == 0:
+        return x, [0.0], True
+    u /= beta
+    v = rmatvec(u)
+    alpha = np.linalg.norm(v)
+    if alpha == 0:
+        return x, [0.0], True
+    v /= alpha
+
+    w = v.copy()
+    phibar = beta
+    rhobar = alpha
+    anorm = 0.0
+    history = [1.0]
+
+    for _ in range(maxiter):
+        u = matvec(v) - alpha * u
+        beta = np.linalg.norm(u)
+        if beta > 0:
+            u /= beta
+        anorm = np.sqrt(anorm ** 2 + alpha ** 2 + beta ** 2)
+
+        v = rmatvec(u) - beta * v
+        alpha = np.linalg.norm(v)
+        if alpha > 0:
+            v /= alpha
+
+        rho = np.hypot(rhobar, beta)
+        c = rhobar / rho
+        s = beta / rho
+        theta = s * alpha
+        rhobar = -c * alpha
+        phi = c * phibar
+        phibar = s * phibar
+
+        x += (phi / rho) * w
+        w = v - (theta / rho) * w
+
+        arnorm = phibar * alpha * abs(c)
+        history.append(arnorm / (anorm * phibar) if phibar > 0 else 0.0)
+        if history[-1] <= tol or phibar / np.linalg.norm(b) <= tol:
+            return x, history, True
+
+    return x, history, history[-1] <= tol
+
+SOLVERS = {"cg": cg, "gmres": gmres, "bicgstab": bicgstab}
+
+PRECONDITIONERS = {"jacobi": jacobi, "ilu0": ilu0}
@@ -1,197 +1,1191 @@
+import os
+import shutil
+import tempfile
+import weakref
 import numpy as np
+import krylov
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from math import lcm
+from tracer import StepTracer, TeeTracer
+from stats import timed
 
 class ColumnSpaceError(Exception):
     pass
 
+def _rref_batch(M, n_cols, eps=1e-10):
+
+    #RREF of every matrix in the (N, m, c) stack M, pivoting in the first n_cols columns
+    #Each column step is one vectorized operation over the whole batch, eps is a scalar or one threshold per system
+
+    M = M.copy()
+    N, m, _ = M.shape
+    eps = np.broadcast_to(np.asarray(eps, dtype = float), (N,))
+    s = np.arange(N)
+    rows = np.arange(m)
+
+    rank = np.zeros(N, dtype = int)
+    pivot_row = np.full((N, n_cols), -1)
+
+    for col in range(n_cols):
+        r = np.minimum(rank, m - 1)
+
+        vals = np.abs(M[:, :, col]) * (rows[None, :] >= rank[:, None])          #Partial pivoting below the current rank
+        c = np.argmax(vals, axis = 1)
+        has = (vals[s, c] > eps) & (rank < m)
+        if not has.any():
+            continue
+
+        row_r = M[s, r].copy()                                                  #Row swap, no-op where there is no pivot
+        row_c = M[s, c].copy()
+        M[s, r] = np.where(has[:, None], row_c, row_r)
+        M[s, c] = np.where(has[:, None], row_r, row_c)
+
+        p = np.where(has, M[s, r, col], 1)
+        M[s, r] /= p[:, None]
+
+        k = M[:, :, col] * has[:, None]                                         #Rank-1 update of all other rows
+        k[s, r] = 0
+        M -= k[:, :, None] * M[s, r][:, None, :]
+        M[has, :, col] = 0
+        M[s[has], r[has], col] = 1
+
+        pivot_row[has, col] = rank[has]
+        rank += has
+
+    return M, pivot_row, rank
+
+def _rref_blocked(M, n_cols, eps=1e-10, block_size=64, n_threads=1, trace=None):
+
+    #Blocked Gauss-Jordan, reduces M in place and returns it with its pivot columns
+    #Each panel of block_size columns is reduced on its own, then the trailing columns get one
+    #matrix-matrix update split over row blocks on a thread pool (numpy releases the GIL in matmul)
+
+    m, c = M.shape
+    n = 0
+    all_pivots = []
+    pool = ThreadPoolExecutor(n_threads) if n_threads > 1 else None
+
+    for col0 in range(0, n_cols, block_size):
+        if n >= m:
+            break
+        col1 = min(col0 + block_size, n_cols)
+
+        orig = M[:, col0:col1].copy()
+        panel = M[:, col0:col1]
+        perm = np.arange(m)
+        pivots = []
+        r = n
+
+        for j in range(col1 - col0):                                            #Unblocked reduction inside the panel
+            if r >= m:
+                break
+            k = r + int(np.argmax(np.abs(panel[r:, j])))
+            if abs(panel[k, j]) < eps:
+                if trace is not None:
+                    trace.skip(col0 + j)
+                continue
+            if trace is not None:
+                trace.pivot(k, col0 + j, panel[k, j])
+            if k != r:
+                panel[[r, k]] = panel[[k, r]]
+                perm[[r, k]] = perm[[k, r]]
+                if trace is not None:
+                    trace.swap(r, k)
+            if trace is not None:
+                trace.scale(r, panel[r, j])
+            panel[r] /= panel[r, j]
+            f = panel[:, j].copy()
+            f[r] = 0
+            panel -= np.outer(f, panel[r])
+            panel[:, j] = 0
+            panel[r, j] = 1
+            if trace is not None:
+                trace.eliminate(r, col0 + j, panel)
+            pivots.append(j)
+            r += 1
+
+        if col1 < c and pivots:
+            T = M[:, col1:]
+            moved = np.nonzero(perm != np.arange(m))[0]                         #Only swapped rows are copied
+            T[moved] = T[perm[moved]]
+            orig = orig[perm]
+
+            S = orig[n:r, pivots]                                               #Pivot block before reduction
+            W = np.linalg.solve(S, T[n:r])
+            X = orig[:, pivots]
+
+            blocks = [(a, min(a + block_size, n)) for a in range(0, n, block_size)]
+            blocks += [(a, min(a + block_size, m)) for a in range(r, m, block_size)]
+
+            def update(block):
+                a, b = block
+                T[a:b] -= X[a:b] @ W
+
+            if pool is not None:
+                list(pool.map(update, blocks))
+            else:
+                for block in blocks:
+                    update(block)
+
+            T[n:r] = W
+
+        all_pivots += [col0 + j for j in pivots]
+        n = r
+
+    if pool is not None:
+        pool.shutdown()
+
+    return M, all_pivots
+
+def _rref_out_of_core(M, n_cols, eps=1e-10, block_size=64, max_bytes=None, trace=None):
+
+    #Blocked Gauss-Jordan on a memory-mapped M, the same steps as _rref_blocked
+    #RAM holds one column panel (m x block_size) and one row block of the trailing columns at a time
+
+    m, c = M.shape
+    step = max(1, (max_bytes or PANEL_BYTES) // (M.itemsize * c))               #Rows per trailing update block
+    n = 0
+    all_pivots = []
+
+    for col0 in range(0, n_cols, block_size):
+        if n >= m:
+            break
+        col1 = min(col0 + block_size, n_cols)
+
+        panel = np.array(M[:, col0:col1])                                       #Read once, reduced in RAM
+        orig = panel.copy()
+        swaps = []
+        pivots = []
+        r = n
+
+        for j in range(col1 - col0):
+            if r >= m:
+                break
+            k = r + int(np.argmax(np.abs(panel[r:, j])))
+            if abs(panel[k, j]) < eps:
+                if trace is not None:
+                    trace.skip(col0 + j)
+                continue
+            if trace is not None:
+                trace.pivot(k, col0 + j, panel[k, j])
+            if k != r:
+                panel[[r, k]] = panel[[k, r]]
+                swaps.append((r, k))
+                if trace is not None:
+                    trace.swap(r, k)
+            if trace is not None:
+                trace.scale(r, panel[r, j])
+            panel[r] /= panel[r, j]
+            f = panel[:, j].copy()
+            f[r] = 0
+            panel -= np.outer(f, panel[r])
+            panel[:, j] = 0
+            panel[r, j] = 1
+            if trace is not None:
+                trace.eliminate(r, col0 + j, panel)
+            pivots.append(j)
+            r += 1
+
+        M[:, col0:col1] = panel
+
+        if col1 < c and pivots:
+            perm = np.arange(m)
+            for a, b in swaps:                                                  #Two rows on disk per swap
+                M[[a, b], col1:] = M[[b, a], col1:]
+                perm[[a, b]] = perm[[b, a]]
+            orig = orig[perm]
+
+            S = orig[n:r, pivots]
+            W = np.linalg.solve(S, M[n:r, col1:])
+            X = orig[:, pivots]
+
+            for a0, a1 in ((0, n), (r, m)):
+                for a in range(a0, a1, step):
+                    b = min(a + step, a1)
+                    M[a:b, col1:] -= X[a:b] @ W
+
+            M[n:r, col1:] = W
+
+        all_pivots += [col0 + j for j in pivots]
+        n = r
+
+    M.flush()
+
+    return M, all_pivots
+
+def _qr_pivoted(M, n_cols, rcond):
+
+    #Householder QR with column pivoting on the first n_cols columns of M, in place
+    #Later columns ride along and end up as Q^H B, stops once every remaining column norm is below rcond * |R[0, 0]|
+    #Returns M (R in its upper part), the column permutation, the rank and |R[0, 0]|
+
+    m = M.shape[0]
+    perm = np.arange(n_cols)
+    rank = 0
+    scale = 0.0
+
+    for k in range(min(m, n_cols)):
+        norms = np.linalg.norm(M[k:, k:n_cols], axis = 0)                       #Recomputed, no downdating drift
+        j = k + int(np.argmax(norms))
+        if k == 0:
+            scale = float(norms[j])
+        if norms[j - k] <= rcond * scale or norms[j - k] == 0:
+            break
+
+        if j != k:
+            M[:, [k, j]] = M[:, [j, k]]
+            perm[[k, j]] = perm[[j, k]]
+
+        x0 = M[k, k]
+        phase = x0 / abs(x0) if x0 != 0 else 1.0
+        v = M[k:, k].copy()
+        v[0] += phase * norms[j - k]                                            #Reflect away from x, no cancellation
+        v /= np.linalg.norm(v)
+
+        w = v.conj() @ M[k:, k:]
+        for a in range(k, m, UPDATE_ROWS):
+            M[a:a + UPDATE_ROWS, k:] -= 2 * np.outer(v[a - k:a - k + UPDATE_ROWS], w)
+        M[k + 1:, k] = 0
+
+        rank += 1
+
+    return M, perm, rank, scale
+
+def _rref_bareiss(rows, n_cols, trace = None):
+
+    #Fraction-free (Bareiss) elimination of a list of integer rows to echelon form, in place
+    #Every division by the previous pivot is exact, so entries stay integers
+    #Returns the pivot columns and the last pivot d, the determinant of the pivot block
+
+    m = len(rows)
+    prev = 1
+    pivots = []
+
+    for col in range(n_cols):
+        r = len(pivots)
+        if r >= m:
+            break
+
+        k = next((i for i in range(r, m) if rows[i][col] != 0), None)
+        if k is None:
+            if trace is not None:
+                trace.skip(col, rows)
+            continue
+
+        if trace is not None:
+            trace.pivot(k, col, rows[k][col])
+
+        if k != r:
+            rows[r], rows[k] = rows[k], rows[r]
+            if trace is not None:
+                trace.swap(r, k, rows)
+
+        pr = rows[r]
+        p = pr[col]
+
+        for i in range(r + 1, m):
+            a = rows[i][col]
+            rows[i] = [(p * x - a * y) // prev for x, y in zip(rows[i], pr)]
+
+        if trace is not None:
+            trace.eliminate(r, col, rows)
+
+        prev = p
+        pivots.append(col)
+
+    return pivots, prev
+
+def _back_bareiss(rows, pivots, d):
+
+    #Fraction-free back substitution, Y[i][q] = d * RREF[i, other[q]] is an integer (Cramer)
+
+    r = len(pivots)
+    pivot_set = set(pivots)
+    other = [j for j in range(len(rows[0])) if j not in pivot_set]
+
+    Y = [None] * r
+    for i in range(r - 1, -1, -1):
+        row = rows[i]
+        coeffs = [(row[pivots[t]], Y[t]) for t in range(i + 1, r)]
+        Y[i] = [(d * row[j] - sum(c * y[q] for c, y in coeffs)) // row[pivots[i]] for q, j in enumerate(other)]
+
+    return other, Y
+
+def _absmax(X):
+
+    #max |X| in row blocks, no full-size temporary, 0 for an empty array
+
+    if X.size == 0:
+        return 0.0
+    X = X.reshape(X.shape[0], -1)
+    step = max(1, PANEL_BYTES // (X.itemsize * X.shape[1]))
+    return max(float(np.max(np.abs(X[a:a + step]))) for a in range(0, X.shape[0], step))
+
+def _threshold(eps, shape, dtype, scale):
+
+    #Zero threshold 10 * max(m, n) * ulp * scale with eps as a floor, scale may hold one magnitude per system
+
+    return np.maximum(eps, 10 * max(shape) * float(np.finfo(dtype).eps) * np.asarray(scale, dtype = float))
+
+UPDATE_ROWS = 256                                                               #Row chunk of the rank-1 update, bounds its temporary
+PANEL_BYTES = 1 << 27                                                           #Out-of-core row block of the trailing update
+
 class LinearEquationSolver:
-    def __init__(self, A, B = None, print_bool = False):
-        self.A = np.array(A, dtype = float)
+    def __init__(self, A, B = None, print_bool = False, block_size = None, n_threads = 1, exact = False,
+                 tracer = None, stats = None, dtype = np.float64, out = None, overwrite_a = False,
+                 workdir = None, cache = None, backend = "rref"):
+        self.exact = exact                                                      #Rational arithmetic on Fractions
+        self.dtype = np.dtype(dtype)                                            #float32 halves the working memory
+        self.out = out                                                          #Caller buffer for [A | B], reduced in place
+        self.overwrite_a = overwrite_a                                          #Allow reducing A itself when B is None
+        self.workdir = workdir                                                  #Output .npy files of an out-of-core solve, owned by the caller
+        self.files = []                                                         #Paths written there, newest last
+        self.cache = cache                                                      #ResultCache shared across solvers, direct solves only
+        if backend not in ("rref", "qr", "svd"):
+            raise ValueError(f"Unknown backend {backend}")
+        self.backend = backend                                                  #"qr" or "svd" factor once, least squares when inconsistent
+        self._A = None
+        self._B = None
+        self._R = None
+        self.A = A
+        self.B = B
+        self.print_bool = print_bool
+        if print_bool and tracer is None:
+            tracer = StepTracer(snapshots = True)                               #print_bool prints the recorded steps
+        self.tracer = tracer                                                    #None keeps the hot loop free of tracing
+        self.stats = stats                                                      #SolverStats, opt-in phase timing and counters
+        self.block_size = block_size                                            #Blocked elimination when set
+        self.n_threads = n_threads
+        self.history = None
+        self.converged = None
+
+        if self.B is not None and hasattr(self.A, "shape") and self.B.shape[0] != self.A.shape[0]:
+            raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+
+    @property
+    def A(self):
+        return self._A
+
+    @A.setter
+    def A(self, A):
+        if krylov.is_operator(A):
+            self._A = A                                                         #Sparse or matvec, iterative methods only
+        else:
+            self._A = self._as_array(A)
+        self._invalidate()
+
+    @property
+    def B(self):
+        return self._B
+
+    @B.setter
+    def B(self, B):
         if B is not None:
-            self.B = np.array(B, dtype = float)
+            self._B = self._as_array(B)
+            if self._B.ndim == 1:
+                self._B = self._B.reshape(-1, 1)                                #Single RHS given as a flat vector
         else:
-            self.B = B
-        self.print_bool = print_bool
+            self._B = B
+        self._invalidate()
 
-        self._check_colspace()
+    def _as_array(self, X):
+        if isinstance(X, (str, os.PathLike)):
+            X = np.load(X, mmap_mode = "r")                                     #.npy path, read from disk as needed
+        if self.exact:
+            X = np.array(X, dtype = object)
+            return np.vectorize(Fraction, otypes = [object])(X) if X.size else X
+        if isinstance(X, np.memmap):
+            return X                                                            #Out-of-core, never copied into RAM
+        if self.overwrite_a:
+            return np.asarray(X, dtype = self.dtype)
+        return np.array(X, dtype = self.dtype)
 
-    def _check_colspace(self, eps=1e-10):
-        m = len(self.A)
+    def _zeros(self, shape):
+        if self.exact:
+            return np.full(shape, Fraction(0), dtype = object)
+        return np.zeros(shape, dtype = self.dtype)
+
+    def _memmap(self, name, shape):
+
+        #Zero-filled .npy output with a unique name, solvers sharing a workdir never truncate each other's files
+        #Without a workdir the files go to a temporary directory removed with the solver, open maps stay valid
+
+        if self.workdir is None:
+            self.workdir = tempfile.mkdtemp(prefix = "les_")
+            weakref.finalize(self, shutil.rmtree, self.workdir, ignore_errors = True)
+        fd, path = tempfile.mkstemp(prefix = name + "_", suffix = ".npy", dir = self.workdir)
+        os.close(fd)
+        self.files.append(path)
+        return np.lib.format.open_memmap(path, mode = "w+", dtype = self.dtype, shape = shape)
+
+    def _out_of_core(self):
+        return isinstance(self.A, np.memmap) and not self.exact
+
+    def _magnitude(self):
+
+        #max |[A | B]|, cached until A or B is replaced
+
+        if self._scale is None:
+            self._scale = max(_absmax(X) for X in (self.A, self.B) if X is not None)
+        return self._scale
+
+    def _eps(self, eps, scale = None):
+
+        #Zero threshold relative to the data, 10 * max(m, n) * ulp * max |[A | B]|, eps is only a floor
+        #Elimination roundoff grows with the entries, a fixed threshold misjudges rank in float32
+
+        if self.exact:
+            return eps
+        if scale is None:
+            scale = self._magnitude()
+        return float(_threshold(eps, self.A.shape, self.dtype, scale))
+
+    def _nonzero(self, X, eps):
+        if self.exact:
+            return np.asarray(X != 0, dtype = bool)
+        return np.abs(X) > eps
+
+    def _trace(self):
+
+        #Tracer handed to the engines, the stats object counts through the same events
+
+        if self.stats is None:
+            return self.tracer
+        if self.tracer is None:
+            return self.stats
+        return TeeTracer(self.tracer, self.stats)
+
+    def _invalidate(self):
+
+        #Drop the cached reduced form, it no longer matches A and B
+
+        self._R = None
+        self._pivot_cols = None
+        self._pivot_row = None
+        self._free_vars = None
+        self._consistent = None
+        self._E = None
+        self._orth = None
+        self._scale = None
+        self._spare = {}                                                        #Row buffers with capacity, see _reserve
+
+    @property
+    def consistent(self):
+
+        #Per column of B, True where that column lies in C(A)
+
+        if self.backend != "rref":
+            return self._orthogonal()[3]
+
+        self._factor()
+        return self._consistent
+
+    def _factor(self, eps=1e-10):
+
+        #Reduce once and cache R, pivot columns, pivot rows and free variables
+
+        if self._R is not None:
+            return self._R
+
+        R, pivot_cols = self._rref()
+
+        if self.print_bool:
+            print(self.tracer.format())
+            print(f"Pivot column numbers are {np.array(pivot_cols) + 1}\n")
+
+        return self._set_state(R, pivot_cols, eps)
+
+    def _set_state(self, R, pivot_cols, eps=1e-10, consistent = None):
+
+        #Derive pivot rows, free variables and consistency from a reduced [A | B]
+        #consistent skips the scan of the zero rows when the caller already knows it
+
+        n_vars = self.A.shape[1]
+        rank = len(pivot_cols)
+
+        self._R = R
+        self._pivot_cols = pivot_cols
+        self._orth = None                                                       #Incremental updates change A or B under it
+        self._pivot_row = {j: i for i, j in enumerate(pivot_cols)}               #Pivot i always sits in row i
+        self._free_vars = [j for j in range(n_vars) if j not in self._pivot_row]
+
+        if consistent is not None:
+            self._consistent = consistent
+        elif self.B is not None:
+            if not self.exact:                                                  #Roundoff also grows with R
+                eps = self._eps(eps, max(self._magnitude(), _absmax(R[:rank])))
+            self._consistent = ~np.any(self._nonzero(R[rank:, n_vars:], eps), axis = 0)
+        else:
+            self._consistent = np.ones(0, dtype = bool)
+
+        return R
+
+    def _ensure_transform(self):
+
+        #Row transform E with R = E [A | B], needed to drop equations or change B without re-solving
+        #Built once by reducing [A | B | I], then kept up to date by every incremental update
+
+        if self._E is not None:
+            return self._E
+
+        m, n = self.A.shape
+        k = self.B.shape[1] if self.B is not None else 0
+
+        I = self._zeros((m, m))
+        I[np.arange(m), np.arange(m)] = Fraction(1) if self.exact else 1.0
+
+        full, pivot_cols = self._rref(extra = I)
+        self._set_state(full[:, :n + k], pivot_cols)
+        self._E = full[:, n + k:]
+
+        return self._E
+
+    def _reserve(self, name, X, rows, cols = None):
+
+        #Buffer whose leading block is X with room for rows (and cols), capacity doubles when it runs out
+        #Zero beyond the used block, appended rows and columns start out clean
+
+        buf = self._spare.get(name)
+        width = X.shape[1] if cols is None else cols
+        if buf is not None and X.base is buf and buf.shape[0] >= rows and buf.shape[1] >= width:
+            return buf
+
+        shape = (max(rows, 2 * X.shape[0]), width if cols is None else max(width, 2 * X.shape[1]))
+        buf = np.full(shape, Fraction(0), dtype = object) if X.dtype == object else np.zeros(shape, dtype = X.dtype)
+        buf[:X.shape[0], :X.shape[1]] = X
+        self._spare[name] = buf
 
+        return buf
+
+    def add_equation(self, row, b = None, eps=1e-10):
+
+        #Append one equation, reduced against the pivot rows in O(rank * (n + k)), plus O(rank * m) with the row transform
+        #R, A, B and E keep spare rows, so the new row is written in place instead of copying every array
+
+        self._factor()
+        m, n = self.A.shape
+        k = self.B.shape[1] if self.B is not None else 0
+        rank = len(self._pivot_cols)
+        pivots = list(self._pivot_cols)
+
+        row = self._as_array(row).reshape(-1)
+        b = self._as_array(b if b is not None else np.zeros(k)).reshape(-1)
+        if row.shape[0] != n or b.shape[0] != k:
+            raise ValueError(f"Equation needs {n} coefficients and {k} right-hand side values")
+
+        new = np.concatenate((row, b))
+        if not self.exact:
+            self._scale = max(self._magnitude(), _absmax(new))
+        eps = self._eps(eps)
+
+        c = new[pivots].copy()
+        new -= c @ self._R[:rank]                                               #Clear the existing pivot columns
+
+        R = self._reserve("R", self._R, m + 1)
+        E = self._E
+        if E is not None:
+            E = self._reserve("E", E, m + 1, m + 1)
+            e = self._zeros(m + 1)
+            e[m] = Fraction(1) if self.exact else 1.0
+            e[:m] -= c @ E[:rank, :m]
+
+        nz = np.nonzero(self._nonzero(new[:n], eps))[0]
+        consistent = self._consistent
+
+        if nz.size:                                                             #New pivot, rank grows by one
+            j = int(nz[0])
+            p = new[j]
+            new /= p
+            new[pivots] = 0
+            new[j] = 1
+
+            f = R[:rank, j].copy()
+            R[:rank] -= np.outer(f, new)
+            R[:rank, j] = 0
+            R[m] = R[rank]                                                      #First zero row moves to the end,
+            R[rank] = new                                                       #the new pivot row takes its place
+            pivots.append(j)
+
+            if E is not None:
+                e /= p
+                E[:rank, :m + 1] -= np.outer(f, e)
+                E[m] = E[rank]
+                E[rank, :m + 1] = e
+        else:
+            R[m] = new
+            if E is not None:
+                E[m, :m + 1] = e
+            if k:                                                               #Only the new zero row can break consistency
+                growth = self._eps(eps, max(self._magnitude(), _absmax(R[:rank]))) if not self.exact else eps
+                consistent = consistent & ~self._nonzero(new[n:], growth)
+
+        A = self._reserve("A", self.A, m + 1)
+        A[m] = row
+        self._A = A[:m + 1]
         if self.B is not None:
-            if np.shape(self.B) != (m, 1):
-                raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+            B = self._reserve("B", self.B, m + 1)
+            B[m] = b
+            self._B = B[:m + 1]
+
+        self._set_state(R[:m + 1], pivots, eps, consistent)
+        self._E = E[:m + 1, :m + 1] if E is not None else None
+
+    def remove_equation(self, i, eps=1e-10):
+
+        #Drop equation i using the row transform, O(m * (n + k + m))
+        #A zero row that depends on equation i absorbs it and the rank is kept, otherwise a pivot row goes
 
-        R = self._rref()
-        n_vars = R.shape[1] - 1
+        E = self._ensure_transform()
+        eps = self._eps(eps)
+        R = self._R
+        rank = len(self._pivot_cols)
+        pivots = list(self._pivot_cols)
 
-        for row in R:
-            if all(abs(row[j]) < eps for j in range(n_vars)) and abs(row[-1]) > eps:
+        col = np.abs(E[:, i])
+        z = rank + int(np.argmax(col[rank:])) if rank < len(col) else None
+        if z is None or not self._nonzero(col[z], eps):
+            z = int(np.argmax(col[:rank]))
+
+        f = E[:, i] / E[z, i]
+        f[z] = 0
+        R = np.delete(R - np.outer(f, R[z]), z, axis = 0)
+        E = np.delete(np.delete(E - np.outer(f, E[z]), z, axis = 0), i, axis = 1)
+
+        if z < rank:
+            pivots.pop(z)
+
+        self._A = np.delete(self.A, i, axis = 0)
+        if self.B is not None:
+            self._B = np.delete(self.B, i, axis = 0)
+
+        self._set_state(R, pivots, eps)
+        self._E = E
+
+    def update_rhs(self, b, i = None, eps=1e-10):
+
+        #New right-hand side through the row transform, R[:, n:] = E B
+        #With i, only b_i changes and the update is a rank-1 correction in O(m * k)
+
+        E = self._ensure_transform()
+        n = self.A.shape[1]
+
+        if i is None:
+            B = self._as_array(b)
+            if B.ndim == 1:
+                B = B.reshape(-1, 1)
+            if B.shape[0] != self.A.shape[0]:
                 raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+            R = np.hstack((self._R[:, :n], E @ B))
+            self._scale = None
+        else:
+            value = self._as_array(b).reshape(-1)
+            if self.B is None:                                                  #No B yet, it starts as zeros with k = len(b)
+                B = self._zeros((self.A.shape[0], len(value)))
+                R = np.hstack((self._R[:, :n], self._zeros((len(self._R), len(value)))))
+            else:
+                B = self.B.copy()
+                R = self._R.copy()
+            R[:, n:] += np.outer(E[:, i], value - B[i])
+            B[i] = value
+            if not self.exact:
+                self._scale = max(self._magnitude(), _absmax(value))
+
+        self._B = B
+        self._set_state(R, self._pivot_cols, eps)
+
+    @timed
+    def _check_colspace(self, eps=1e-10):
+        m = len(self.A)
+
+        if self.B is None:
+            return None
+
+        if self.B.ndim != 2 or self.B.shape[0] != m:
+            raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+
+        self._factor()
+
+        if self.B.shape[1] == 1 and not self._consistent[0]:                   #Several RHS report per column instead
+            raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
 
         return None
 
+    @timed
     def _find_nullspace(self, eps=1e-10):
-        R = self._rref()
-        if self.B is not None:
-            n_vars = R.shape[1] - 1
-        else:
-            n_vars = R.shape[1]
 
-        pivot_cols = []
-        for row in R:
-            for j in range(n_vars):
-                if abs(row[j] - 1) < eps:
-                    pivot_cols.append(j)
-                    break
+        #Basis as the columns of one (n, k) array, N[pivots] = -R[:rank, free] and N[free] = I
 
-        free_vars = [j for j in range(n_vars) if j not in pivot_cols]
+        R = self._factor()
+        n_vars = self.A.shape[1]
+        pivots = self._pivot_cols
+        free = self._free_vars
 
-        basis = []
+        if self._out_of_core():
+            N = self._memmap("nullspace", (n_vars, len(free)))
+            step = max(1, PANEL_BYTES // (N.itemsize * max(len(free), 1)))
+            for a in range(0, len(pivots), step):                               #Row blocks of R, bounded RAM
+                b = min(a + step, len(pivots))
+                N[pivots[a:b], :] = -R[a:b][:, free]
+            N[free, np.arange(len(free))] = 1.0
+            N.flush()
+            return N
 
-        for free in free_vars:
-            vec = np.zeros(n_vars)
-            vec[free] = 1
+        N = self._zeros((n_vars, len(free)))
+        N[pivots, :] = -R[:len(pivots), free]
+        N[free, np.arange(len(free))] = Fraction(1) if self.exact else 1.0
 
-            for i, row in enumerate(R):
-                for j in pivot_cols:
-                    if abs(row[j] - 1) < eps:
-                        vec[j] = -row[free]
+        if self.stats is not None:
+            self.stats.allocated(N)
 
-            basis.append(vec)
+        return N
 
-        return basis
+    @timed
+    def _augment_matrix(self, extra = None):
 
-    def _augment_matrix(self):
-        if self.B is not None:
-            aug_matrix = self.A.tolist()
+        #Writes [A | B] once into the working buffer the elimination reduces in place
+        #extra columns ride along after B, the identity is used to record the row transform
 
-            for i in range(len(self.A)):
-                aug_matrix[i].append(self.B[i][0])
+        if self.exact:
+            parts = [self.A] + [X for X in (self.B, extra) if X is not None]
+            return np.hstack(parts) if len(parts) > 1 else self.A
 
-            aug_matrix = np.array(aug_matrix)
+        m, n = self.A.shape
+        k = self.B.shape[1] if self.B is not None else 0
+        e = extra.shape[1] if extra is not None else 0
 
-            return aug_matrix
+        if k + e == 0 and self.overwrite_a and self.out is None and not self._out_of_core():
+            return self.A
 
-        return self.A
+        aug_matrix = self.out if e == 0 else None
+        if aug_matrix is None and self._out_of_core():
+            aug_matrix = self._memmap("reduced", (m, n + k + e))
+        elif aug_matrix is None:
+            aug_matrix = np.empty((m, n + k + e), dtype = self.dtype)
+        elif aug_matrix.shape != (m, n + k) or aug_matrix.dtype != self.dtype:
+            raise ValueError(f"out must have shape {(m, n + k)} and dtype {self.dtype}")
 
-    def _rref(self):
-        temp = self._augment_matrix()
+        aug_matrix[:, :n] = self.A
+        if k:
+            aug_matrix[:, n:n + k] = self.B
+        if e:
+            aug_matrix[:, n + k:] = extra
 
-        for n in range(min(len(temp), len(temp[0]))):
+        return aug_matrix
 
-            col = n
-            while col < len(temp[0]) and abs(temp[n][col]) < 1e-10:
-                col += 1
+    def _rref_exact(self, extra = None):
 
-            if col >= len(temp[0]):
-                if self.print_bool:
-                    print("No pivot possible in this row")
-                continue
+        #Scale each row of [A | B] to integers, reduce with Bareiss, divide by d only at the end
 
-            p = temp[n][col]
+        aug = self._augment_matrix(extra)
+        cols = self.A.shape[1]
 
-            if self.print_bool:
-                print(f"Pivot is {p}")
+        rows = []
+        for row in aug.tolist():
+            scale = lcm(1, *(x.denominator for x in row))
+            rows.append([int(x * scale) for x in row])
 
-            c = n
-            while abs(p) < 1e-10:
-                c += 1
-                if c >= len(temp):
-                    break
+        pivots, d = _rref_bareiss(rows, cols, self._trace())
+        other, Y = _back_bareiss(rows, pivots, d)
 
-                temp[n], temp[c] = temp[c].copy(), temp[n].copy()
-                if self.print_bool:
-                    print("Swapping Rows")
+        R = np.full(aug.shape, Fraction(0), dtype = object)
+        for i, col in enumerate(pivots):
+            R[i, col] = Fraction(1)
+            R[i, other] = [Fraction(y, d) for y in Y[i]]
+        for i in range(len(pivots), len(rows)):
+            R[i] = [Fraction(x) for x in rows[i]]                               #Zero in A, nonzero B marks inconsistency
 
-                p = temp[n][col]
-                if self.print_bool:
-                    print(f"New pivot is {p}")
+        return R, pivots
 
-            if abs(p) < 1e-10:
-                if self.print_bool:
-                    print("No valid pivot in this column, continuing")
-                continue
+    @timed
+    def _rref(self, eps=1e-10, extra=None):
 
-            temp[n] = temp[n] / p
-            if self.print_bool:
-                print(f"R after p = 1 is \n{temp}")
+        #Returns the reduced [A | B] and its pivot columns, pivot i is in row i
 
-            for m in range(len(temp)):
-                if m == n:
-                    continue
+        if self.exact:
+            return self._rref_exact(extra)
 
-                k = temp[m][col]
-                temp[m] = temp[m] - k * temp[n]
+        eps = self._eps(eps)
+        temp = self._augment_matrix(extra)                                         #Working buffer, never A unless overwrite_a
+        rows = temp.shape[0]
+        cols = self.A.shape[1]                                                  #Pivots only in A, B columns ride along
 
-                if self.print_bool:
-                    print(f"R is \n{temp}")
+        if self.stats is not None:
+            self.stats.allocated(temp)
 
-        R = np.array(temp, dtype = float)
+        trace = self._trace()
 
-        if self.print_bool:
-            print(f"R is:\n{R}")
+        if isinstance(temp, np.memmap):                                         #Panels from disk, no whole-matrix snapshots
+            return _rref_out_of_core(temp, cols, eps, self.block_size or 64, None, self.stats)
 
-        return R
+        if self.block_size and self.tracer is None:                             #Step replay needs whole-matrix snapshots
+            return _rref_blocked(temp, cols, eps, self.block_size, self.n_threads, self.stats)
 
-    def _soln_extract(self, eps=1e-10):
-        R = self._rref()
+        pivots = []
+        n = 0
+        for col in range(cols):
+            if n >= rows:
+                break
 
-        rows, cols = R.shape
-        n_vars = cols - 1
+            c = n + int(np.argmax(np.abs(temp[n:, col])))                       #Partial pivoting on largest entry
+            p = temp[c, col]
 
-        pivot_cols = []
-        pivot_row = {}
+            if abs(p) < eps:
+                if trace is not None:
+                    trace.skip(col, temp)
+                continue
+
+            if trace is not None:
+                trace.pivot(c, col, p)
 
-        for i in range(rows):
-            if self.print_bool:
-                print(f"Row no. {i + 1}: \n{R[i]}\n")
+            if c != n:
+                temp[[n, c]] = temp[[c, n]]
+                if trace is not None:
+                    trace.swap(n, c, temp)
 
-            for j in range(n_vars):
-                if self.print_bool:
-                    print(f"Column no. {j + 1}: \n{R[:, j]}\n")
-                    print(f"Element is {R[i, j]}")
+            temp[n] /= p
+            if trace is not None:
+                trace.scale(n, p, temp)
 
-                    print(f"Checking: abs(R[i, j] - 1) < eps --> {abs(R[i, j] - 1) < eps}")
-                    print(f"Checking: all(abs(R[i, k]) < eps for k in range(rows) if k != j --> "
-                          f"{all(abs(R[k, j]) < eps for k in range(rows) if k != i)}\n")
+            k = temp[:, col].copy()                                              #Rank-1 update clears the column
+            k[n] = 0
+            prow = temp[n]
+            for a in range(0, rows, UPDATE_ROWS):
+                temp[a:a + UPDATE_ROWS] -= np.outer(k[a:a + UPDATE_ROWS], prow)
+            temp[:, col] = 0
+            temp[n, col] = 1
 
-                if abs(R[i, j] - 1) < eps and all(abs(R[k, j]) < eps for k in range(rows) if k != i):
-                    if self.print_bool:
-                        print(f"Column no. {j + 1} is a pivot column\n")
-                    pivot_cols.append(j)
-                    pivot_row[j] = i
-                    break
+            if trace is not None:
+                trace.eliminate(n, col, temp)
 
-                if self.print_bool:
-                    print(f"Column no. {j + 1} is not a pivot column\n")
+            pivots.append(col)
+            n += 1
 
-                    print(f"Pivot column numbers are {np.array(pivot_cols) + 1}\n")
+        R = temp
 
-        free_vars = [j for j in range(n_vars) if j not in pivot_cols]
+        return R, pivots
+
+    @timed
+    def _soln_extract(self, eps=1e-10):
+        R = self._factor()
+        n_vars = self.A.shape[1]
 
         if self.print_bool:
-            print(f"Free Variables are {np.array(free_vars) + 1}\n")
+            print(f"Free Variables are {np.array(self._free_vars) + 1}\n")
 
-        x_p = np.zeros((n_vars, 1))
-        for j in pivot_cols:
-            x_p[j, 0] = R[pivot_row[j], -1]
-            if self.print_bool:
-                print(f"Extracting particular solution:\n {x_p}")
+        n_rhs = self.B.shape[1] if self.B is not None else 1
+
+        x_p = self._zeros((n_vars, n_rhs))
+        if self.B is not None:
+            x_p[self._pivot_cols, :] = R[:len(self._pivot_cols), n_vars:]
+
+            x_p[:, ~self._consistent] = np.nan                                  #No particular solution for these columns
+
+        if self.stats is not None:
+            self.stats.allocated(x_p)
 
         if self.print_bool:
             print(f"Particular solution is: \n {x_p}")
 
-        if len(free_vars) == 0:
+        if len(self._free_vars) == 0:
             return x_p, 0
 
         nullspace = self._find_nullspace()
 
         return x_p, nullspace
 
-    def solve(self):
-        x = self._soln_extract()
+    def solve(self, method = "direct", tol=1e-8, maxiter=None, precond=None):
+
+        #method is "direct" (RREF) or one of "cg", "gmres", "bicgstab", "lsqr"
+        #Iterative methods store per-column residual history in self.history
+
+        if self.stats is not None:
+            self.stats.count("solves")
+
+        if method == "direct":
+            if krylov.is_sparse(self.A):                                        #Sparse elimination, memory follows the fill
+                from sparse_solver import SparseLinearEquationSolver            #Deferred, sparse_solver imports this module
+                return SparseLinearEquationSolver(self.A, self.B).solve()
+            if krylov.is_operator(self.A):
+                raise ValueError("Direct method needs a dense A or a scipy.sparse matrix, use an iterative method")
+            if self.backend != "rref":
+                x_p, nullspace, _, _ = self._orthogonal()
+                return x_p.copy(), nullspace.copy() if nullspace.shape[1] else 0
+            if self.cache is not None and not self._out_of_core():
+                return self._solve_cached()
+            self._check_colspace()
+            x = self._soln_extract()
+            return x
+
+        return self._solve_iterative(method, tol, maxiter, precond)
+
+    def _solve_cached(self, eps=1e-10):
+
+        #Equal A, B, dtype and tolerance share one entry holding R, the pivots and the solution
+        #A hit restores the factorization state without eliminating, inconsistency still raises
+
+        key = self.cache.key("solve", self.A, self.B, self._eps(eps))
+        entry = self.cache.get(key)
+
+        if entry is None:
+            self._factor()
+            x_p, nullspace = self._soln_extract()
+            entry = (np.array(self._R), list(self._pivot_cols), x_p, nullspace)
+            self.cache.put(key, entry)
+        elif self._R is None:
+            self._set_state(np.array(entry[0]), list(entry[1]), eps)
+
+        self._check_colspace()
+        x_p, nullspace = entry[2], entry[3]
+
+        return np.array(x_p), nullspace if isinstance(nullspace, int) else np.array(nullspace)
+
+    @timed
+    def _orthogonal(self):
+
+        #One rank-revealing factorization of A, column-pivoted QR or SVD, gives everything at once:
+        #rank with a tolerance relative to the largest singular value (or |R[0, 0]|), an orthonormal
+        #nullspace basis, the minimum-norm least squares x_p, and consistency from the residual
+        #Returns x_p, nullspace, rank, consistent
+
+        if self._orth is not None:
+            return self._orth
+        if self.exact:
+            raise ValueError(f"backend {self.backend} needs floating point, not exact")
+
+        aug = self._augment_matrix()
+        m, n = self.A.shape
+        k = aug.shape[1] - n
+        rcond = max(m, n) * float(np.finfo(aug.dtype).eps)
+
+        if self.backend == "svd":
+            U, sv, Vh = np.linalg.svd(aug[:, :n], full_matrices = True)
+            scale = float(sv[0]) if len(sv) else 0.0
+            rank = int(np.sum(sv > rcond * scale)) if scale else 0
+            c = U.conj().T @ aug[:, n:]
+            x_p = Vh[:rank].conj().T @ (c[:rank] / sv[:rank, None])
+            nullspace = np.ascontiguousarray(Vh[rank:].conj().T)
+        else:
+            R, perm, rank, scale = _qr_pivoted(aug, n, rcond)
+            c = R[:, n:]
+
+            #Complete orthogonal decomposition, [R11 R12]^H = Z T, so y = Z1 T^-H c1 is the minimum-norm solution
+
+            Z, T = np.linalg.qr(np.triu(R[:rank, :n]).conj().T, mode = "complete")
+            y = Z[:, :rank] @ np.linalg.solve(T[:rank].conj().T, c[:rank]) if rank else np.zeros((n, k), aug.dtype)
+
+            x_p = np.empty((n, k), dtype = aug.dtype)
+            x_p[perm] = y
+            nullspace = np.empty((n, n - rank), dtype = aug.dtype)              #One contiguous orthonormal block
+            nullspace[perm] = Z[:, rank:]
+
+        residual = np.linalg.norm(c[rank:], axis = 0)                            #Part of B outside C(A)
+        bound = rcond * (scale * np.linalg.norm(x_p, axis = 0) + np.linalg.norm(aug[:, n:], axis = 0))
+        consistent = residual <= bound
+
+        if self.B is None:
+            x_p = np.zeros((n, 1), dtype = aug.dtype)
+
+        if self.stats is not None:
+            self.stats.allocated(x_p, nullspace)
+
+        self._orth = (x_p, nullspace, rank, consistent)
+
+        return self._orth
+
+    def _solve_iterative(self, method, tol, maxiter, precond):
+        if self.B is None:
+            raise ValueError("Iterative methods need a right-hand side B")
+
+        matvec, rmatvec, shape = krylov._operator(self.A, self.B.shape[0])
+
+        if method != "lsqr" and shape[0] != shape[1]:
+            raise ValueError(f"{method} needs a square A, use lsqr for rectangular systems")
+
+        if method not in krylov.SOLVERS and method != "lsqr":
+            raise ValueError(f"Unknown method {method}")
+
+        if isinstance(precond, str):
+            psolve = krylov.PRECONDITIONERS[precond](self.A)
+        else:
+            psolve = precond
+
+        x_p = np.zeros((shape[1], self.B.shape[1]))
+        self.history = []
+        self.converged = []
+
+        for j in range(self.B.shape[1]):
+            b = self.B[:, j]
+            if method == "lsqr":
+                x, history, converged = krylov.lsqr(matvec, rmatvec, b, shape[1], tol, maxiter)
+            else:
+                x, history, converged = krylov.SOLVERS[method](matvec, b, tol, maxiter, psolve)
+
+            x_p[:, j] = x
+            self.history.append(history)
+            self.converged.append(bool(converged))
+
+        return x_p, 0
+
+    @staticmethod
+    def solve_batch(A, B = None, eps=1e-10):
+
+        #Solve a stack of independent systems A[s] x = B[s] with one vectorized elimination
+        #Returns x_p, nullspace, free, rank, consistent where nullspace[s][:, free[s]] is the basis of system s
+
+        A = np.asarray(A)
+        dtype = np.result_type(A, B if B is not None else A, float)            #Complex stacks stay complex
+        A = A.astype(dtype)
+        N, m, n = A.shape
+
+        if B is None:
+            B = np.zeros((N, m, 0), dtype = dtype)
+            flat = False
+        else:
+            B = np.asarray(B, dtype = dtype)
+            flat = B.ndim == 2
+            if flat:
+                B = B[:, :, None]
+            if B.shape[:2] != (N, m):
+                raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+
+        M = np.concatenate((A, B), axis = 2)
+        scale = np.abs(M).reshape(N, -1).max(axis = 1) if M.size else np.zeros(N)
+        R, pivot_row, rank = _rref_batch(M, n, _threshold(eps, (m, n), dtype, scale))
+        is_pivot = pivot_row >= 0
+        free = ~is_pivot
+
+        P = np.zeros((N, n, m))                                                 #P[s, j, i] = 1 when pivot j sits in row i
+        s_idx, j_idx = np.nonzero(is_pivot)
+        P[s_idx, j_idx, pivot_row[s_idx, j_idx]] = 1
+
+        x_p = P @ R[:, :, n:]
+        nullspace = (np.eye(n) - P @ R[:, :, :n]) * free[:, None, :]
+
+        zero_rows = np.arange(m)[None, :] >= rank[:, None]
+        growth = (np.abs(R) * ~zero_rows[:, :, None]).reshape(N, -1).max(axis = 1) if R.size else np.zeros(N)
+        tol = _threshold(eps, (m, n), dtype, np.maximum(scale, growth))         #Per system, as _set_state does
+        consistent = ~np.any((np.abs(R[:, :, n:]) > tol[:, None, None]) & zero_rows[:, :, None], axis = 1)
+        x_p[~consistent[:, None, :].repeat(n, axis = 1)] = np.nan
+
+        if flat:
+            x_p = x_p[:, :, 0]
+            consistent = consistent[:, 0]
+
+        return x_p, nullspace, free, rank, consistent
+
+    @staticmethod
+    def factor(A, eps=1e-10):
+
+        #Factor A once for repeated solves against new right-hand sides
+
+        return LUFactorization(A, eps)
+
+
+class LUFactorization:
+
+    #PLU factorization of A with its pivot and free-column structure
+    #Holds only arrays, so it pickles and can be shipped to worker processes
+
+    def __init__(self, A, eps=1e-10):
+        U = np.array(A, dtype = float)
+        m, n = U.shape
+
+        L = np.eye(m)
+        perm = np.arange(m)
+        pivot_cols = []
+        scale = _absmax(U)
+        tol = float(_threshold(eps, (m, n), U.dtype, scale))                    #Relative to max |A|, eps is only a floor
+
+        r = 0
+        for col in range(n):
+            if r >= m:
+                break
+
+            c = r + int(np.argmax(np.abs(U[r:, col])))                          #Partial pivoting on largest entry
+            if abs(U[c, col]) < tol:
+                continue
+
+            if c != r:
+                U[[r, c]] = U[[c, r]]
+                L[[r, c], :r] = L[[c, r], :r]
+                perm[[r, c]] = perm[[c, r]]
+
+            l = U[r + 1:, col] / U[r, col]
+            L[r + 1:, r] = l
+            U[r + 1:] -= np.outer(l, U[r])
+            U[r + 1:, col] = 0
+
+            pivot_cols.append(col)
+            r += 1
+
+        self.shape = (m, n)
+        self.eps = eps
+        self.scale = max(scale, _absmax(U[:r]))                                 #Includes the growth of U
+        self.rank = r
+        self.L = L
+        self.U = U[:r]
+        self.perm = perm
+        self.pivot_cols = pivot_cols
+        self.free_vars = [j for j in range(n) if j not in pivot_cols]
+        self._nullspace = None
+
+    def _forward(self, b):
+
+        #Solve L y = P b, O(m^2)
+
+        y = b[self.perm].copy()
+        for i in range(1, len(y)):
+            y[i] -= self.L[i, :i] @ y[:i]
+        return y
+
+    def _back(self, y):
+
+        #Solve U[:, pivots] x = y for the pivot variables, O(rank^2)
+
+        U = self.U[:, self.pivot_cols]
+        x = np.zeros_like(y)
+        for i in range(self.rank - 1, -1, -1):
+            x[i] = (y[i] - U[i, i + 1:] @ x[i + 1:]) / U[i, i]
         return x
 
+    def solve(self, b):
+        b = np.array(b, dtype = float)
+        if b.ndim == 1:
+            b = b.reshape(-1, 1)
+
+        m, n = self.shape
+        if b.ndim != 2 or b.shape[0] != m:
+            raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+
+        y = self._forward(b)
+        tol = _threshold(self.eps, self.shape, float, max(self.scale, _absmax(b), _absmax(y[:self.rank])))
+        consistent = ~np.any(np.abs(y[self.rank:]) > tol, axis = 0)
+
+        if b.shape[1] == 1 and not consistent[0]:
+            raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+
+        x_p = np.zeros((n, b.shape[1]))
+        x_p[self.pivot_cols, :] = self._back(y[:self.rank])
+        x_p[:, ~consistent] = np.nan
+
+        return x_p
+
+    def nullspace(self):
+        if self._nullspace is not None:
+            return self._nullspace
+
+        n = self.shape[1]
+        free = self.free_vars
+
+        N = np.zeros((n, len(free)))
+        N[free, np.arange(len(free))] = 1
+        N[self.pivot_cols, :] = self._back(-self.U[:, free])                    #Pivot variables for each free variable
+
+        self._nullspace = N
+
+        return N
+
 
 
 if __name__ == '__main__':
@@ -1,16 +1,69 @@
+import io
 import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QFrame, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QLineEdit,
-                             QWidget, QPushButton)
+                             QWidget, QPushButton, QTableView, QFileDialog)
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal, QAbstractTableModel, QModelIndex
+import numpy as np
 from linear_equations_solver import LinearEquationSolver as LES
 from linear_equations_solver import ColumnSpaceError
+from tracer import ProgressTracer, SolveCancelled
 
 width = 700
 height = 500
 
 RESIZE_MARGIN = 8
 
+SYSTEM_FILES = "Systems (*.csv *.npy *.npz)"
+SOLUTION_FILES = "CSV (*.csv);;NumPy array (*.npy);;NumPy archive (*.npz)"
+
+def read_table(text):
+
+    #Tab separated block, as copied from a spreadsheet
+
+    return np.loadtxt(io.StringIO(text), delimiter = "\t", ndmin = 2)
+
+def read_system(path):
+
+    #A and B arrays from .npz, otherwise one [A | b] table from .csv or .npy
+
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            A = np.atleast_2d(np.asarray(data["A"], dtype = float))
+            B = np.asarray(data["B"], dtype = float) if "B" in data.files else np.zeros(len(A))
+        return A, B.reshape(len(A), -1)
+
+    if path.endswith(".npy"):
+        M = np.atleast_2d(np.load(path).astype(float))
+    else:
+        M = np.loadtxt(path, delimiter = ",", ndmin = 2)
+
+    return M[:, :-1], M[:, -1:]
+
+def solution_table(x):
+
+    #[x_p | nullspace basis] as one array, a solve without free variables has no basis columns
+
+    x_p, nullspace = x
+    x_p = np.asarray(x_p, dtype = float)
+    if isinstance(nullspace, int):
+        nullspace = np.zeros((x_p.shape[0], 0))
+    return x_p, np.asarray(nullspace, dtype = float)
+
+def write_solution(path, x):
+    x_p, nullspace = solution_table(x)
+    if path.endswith(".npz"):
+        np.savez(path, x_p = x_p, nullspace = nullspace)
+    elif path.endswith(".npy"):
+        np.save(path, np.column_stack((x_p, nullspace)))
+    else:
+        np.savetxt(path, np.column_stack((x_p, nullspace)), delimiter = ",", fmt = "%.17g")
+
+def format_solution(x):
+    out = io.StringIO()
+    np.savetxt(out, np.column_stack(solution_table(x)), delimiter = "\t", fmt = "%.17g")
+    return out.getvalue()
+
 class Header(QFrame):
 
     #Header drag only logic
@@ -67,6 +120,111 @@ class HintLineEdit(QLineEdit):
 
 
 
+class CoefficientModel(QAbstractTableModel):
+
+    #Table model over one (equations, variables + 1) array, the last column is B
+    #The view only asks for visible cells, so no per-coefficient widgets exist
+
+    def __init__(self, n_eqs, n_vars, parent=None):
+        super().__init__(parent)
+
+        self.n_vars = n_vars
+        self.array = np.zeros((n_eqs, n_vars + 1))                                  #Empty cells are 0, as before
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.array.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.array.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        value = self.array[index.row(), index.column()]
+
+        if role == Qt.DisplayRole:
+            return f"{value:g}" if value else ""                                    #Blank cell reads as 0
+        if role == Qt.EditRole:
+            return repr(float(value))                                               #Round trips exactly, the editor writes it back
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+
+        text = str(value).strip()
+        try:
+            self.array[index.row(), index.column()] = float(text) if text else 0.0
+        except ValueError:                                                          #Keep the old value
+            return False
+
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return f"Eq {section + 1}"
+        if section < self.n_vars:
+            return f"x{section + 1}"
+        return "b" if self.array.shape[1] == self.n_vars + 1 else f"b{section - self.n_vars + 1}"
+
+    def set_system(self, A, B):
+
+        #Replace the whole array at once, the view refetches only what it shows
+
+        self.beginResetModel()
+        self.n_vars = A.shape[1]
+        self.array = np.column_stack((A, B)).astype(float)
+        self.endResetModel()
+
+    def A(self):
+        return self.array[:, :self.n_vars]
+
+    def B(self):
+        return self.array[:, self.n_vars:]
+
+
+
+class SolveWorker(QObject):
+
+    #Runs a solver or eigen job on a QThread, everything comes back to the window by signal
+
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+
+    def __init__(self, job, n_cols):
+        super().__init__()
+        self.job = job                                                              #Called as job(tracer)
+        self.tracer = ProgressTracer(n_cols, self.progress.emit)
+
+    def run(self):
+        try:
+            result = self.job(self.tracer)
+        except SolveCancelled:
+            self.cancelled.emit()
+        except Exception as e:                                                      #Handed to the GUI thread
+            self.failed.emit(e)
+        else:
+            self.done.emit(result)
+
+    def cancel(self):
+
+        #Called from the GUI thread, the elimination stops at its next step
+
+        self.tracer.cancel()
+
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -111,6 +269,11 @@ class MainWindow(QMainWindow):
         self.submit_button = QPushButton(self, text = "Submit")
         self.coeff_submit_button = QPushButton(self, text = "Solve")
         self.reset_button = QPushButton(self, text = "Reset")
+        self.cancel_button = QPushButton(self, text = "Cancel")
+        self.import_button = QPushButton(self, text = "Import")
+        self.paste_button = QPushButton(self, text = "Paste")
+        self.export_button = QPushButton(self, text = "Export")
+        self.copy_button = QPushButton(self, text = "Copy")
 
         #Title Label Definition
         self.name_label = QLabel("Linear Equations Solver", self)
@@ -125,20 +288,24 @@ class MainWindow(QMainWindow):
         #Coefficient Intro Text Definition
         self.coeff_text = QLabel("Enter the coefficients of the equation:")
 
+        #Solver Progress Label Definition
+        self.progress_label = QLabel("")
+
         #Variable Definitions
         self.n_eqs = None
         self.n_vars = None
-        self.coeff_boxes = None
-        self.variable_labels = None
-        self.equals_labels = None
-        self.plus_labels = None
-        self.ans_boxes = None
+        self.coeff_model = None
+        self.coeff_view = None
         self.A_matrix = None
         self.B_matrix = None
         self.x = None
 
         self.solution_widgets = []
 
+        #Background Job Definitions
+        self.worker = None
+        self.worker_thread = None
+
         #Mouse Movement Variable Definitions
         self._drag_pos = None
         self._mouse_pos = None
@@ -215,6 +382,13 @@ class MainWindow(QMainWindow):
         self.general_v_layout.addWidget(self.coeff_text)
         self.coeff_text.hide()
 
+        #Solver Progress Text
+        self.progress_label.setFont(QFont("Arial", 14))
+        self.progress_label.setStyleSheet("color: black;")
+        self.progress_label.setAlignment(Qt.AlignCenter)
+        self.general_v_layout.addWidget(self.progress_label)
+        self.progress_label.hide()
+
         #Input Line Edit Style Sheets and Visibility
         self.h_in_layout.addWidget(self.input_n)
         self.input_n.setStyleSheet("background-color: #FFFFFF; border: 2px solid black;")
@@ -230,13 +404,21 @@ class MainWindow(QMainWindow):
         self.button_layout.addWidget(self.submit_button)
         self.button_layout.addWidget(self.coeff_submit_button)
         self.button_layout.addWidget(self.reset_button)
+        self.button_layout.addWidget(self.cancel_button)
+        for button in (self.import_button, self.paste_button, self.export_button, self.copy_button):
+            self.button_layout.addWidget(button)
+            button.setStyleSheet("background-color: #FFFFFF;")
         self.submit_button.setStyleSheet("background-color: #FFFFFF;")
         self.coeff_submit_button.setStyleSheet("background-color: #FFFFFF;")
         self.reset_button.setStyleSheet("background-color: #FFFFFF;")
+        self.cancel_button.setStyleSheet("background-color: #FFFFFF;")
         self.button_layout.setAlignment(Qt.AlignHCenter | Qt.AlignTop)
         self.submit_button.show()
         self.coeff_submit_button.hide()
         self.reset_button.hide()
+        self.cancel_button.hide()
+        self.export_button.hide()
+        self.copy_button.hide()
 
         #Adding Widgets to Main Layout
         for i in [self.general_v_layout, self.v_in_layout, self.h_in_layout, self.coeff_layout, self.button_layout]:
@@ -249,6 +431,11 @@ class MainWindow(QMainWindow):
         self.submit_button.clicked.connect(self.lineqUI)
         self.coeff_submit_button.clicked.connect(self.solver)
         self.reset_button.clicked.connect(self.resetUI)
+        self.cancel_button.clicked.connect(self.cancel_job)
+        self.import_button.clicked.connect(self.import_system)
+        self.paste_button.clicked.connect(self.paste_system)
+        self.export_button.clicked.connect(self.export_solution)
+        self.copy_button.clicked.connect(self.copy_solution)
 
         #Mouse Position Tracking
         self.centralWidget().setMouseTracking(True)
@@ -341,99 +528,163 @@ class MainWindow(QMainWindow):
         if not self.n_vars.isdigit() or not self.n_eqs.isdigit():                   #Check if text is valid
             self.var_eq_err.show()
         else:
-            self.var_eq_err.hide()
-            self.submit_button.hide()                                                   # Adjust widget visibility
-            self.input_n.hide()
-            self.input_m.hide()
-            self.coeff_submit_button.show()
-            self.intro_text.hide()
-            self.coeff_text.show()
-
-            self.n_vars = int(self.n_vars)                                              #Set text to int datatype
-            self.n_eqs = int(self.n_eqs)
-
-            self.coeff_boxes = []                                                       #Initialize coefficient widget storage
-            self.ans_boxes = []
-            self.variable_labels = []
-            self.equals_labels = []
-            self.plus_labels = []
-
-            for row in range(self.n_eqs):                                               #Coefficient widget logic
-                row_boxes = []
-
-                for col in range(self.n_vars):
-                    coeff_box = HintLineEdit(f"a{row*self.n_vars + col + 1}", self)
-                    variable_label = QLabel(f"x{col + 1}")
-                    plus_label = QLabel("+")
-
-                    coeff_box.setStyleSheet("background-color: #FFFFFF;"
-                                            "border-color: black;")
-                    variable_label.setStyleSheet("color : black;")
-                    plus_label.setStyleSheet("Color : black;")
-
-                    coeff_box.setFixedSize(100, 80)
-                    
-                    coeff_h_layout = QHBoxLayout()
-                    coeff_h_layout.setContentsMargins(0, 0, 0, 0)
-                    coeff_h_layout.setSpacing(2)
-                    
-                    if col != 0:
-                        coeff_h_layout.addWidget(plus_label)
-                        self.plus_labels.append(plus_label)
-                    coeff_h_layout.addWidget(coeff_box)
-                    coeff_h_layout.addWidget(variable_label)
-
-                    self.coeff_layout.addLayout(coeff_h_layout, row, col, alignment = Qt.AlignLeft)
-
-                    row_boxes.append(coeff_box)
-                    self.variable_labels.append(variable_label)
-
-                ans_box = HintLineEdit(f"b{row + 1}", self)                        #RHS widget logic
-                ans_box.setStyleSheet("background-color: #FFFFFF;")
-
-                ans_box.setFixedSize(100, 80)
-
-                equals_label = QLabel("=")
-                equals_label.setStyleSheet("color : black;")
-
-                ans_h_layout = QHBoxLayout()
-                ans_h_layout.setContentsMargins(0, 0, 0, 0)
-                ans_h_layout.setSpacing(2)
-
-                ans_h_layout.addWidget(equals_label)
-                ans_h_layout.addWidget(ans_box)
-
-                self.coeff_layout.addLayout(ans_h_layout, row, self.n_vars + 1, alignment = Qt.AlignLeft)
-
-                self.coeff_boxes.append(row_boxes)
-                self.ans_boxes.append(ans_box)
-                self.equals_labels.append(equals_label)
+            self.gridUI(int(self.n_eqs), int(self.n_vars))                          #Set text to int datatype
+
+    def gridUI(self, n_eqs, n_vars):
+
+        #Coefficient table for typed, imported or pasted systems
+
+        self.var_eq_err.hide()
+        self.submit_button.hide()                                                   # Adjust widget visibility
+        self.input_n.hide()
+        self.input_m.hide()
+        self.coeff_submit_button.show()
+        self.intro_text.hide()
+        self.coeff_text.show()
+        self.progress_label.hide()
+
+        self.n_vars = n_vars
+        self.n_eqs = n_eqs
+
+        self.clear_layout(self.coeff_layout)                                        #Importing again replaces the table
+
+        self.coeff_view = QTableView(self)
+        self.coeff_model = CoefficientModel(self.n_eqs, self.n_vars, self.coeff_view)    #One array behind the whole grid
+        self.coeff_view.setModel(self.coeff_model)
+        self.coeff_view.setStyleSheet("background-color: #FFFFFF;"
+                                      "color: black;")
+        self.coeff_view.horizontalHeader().setDefaultSectionSize(80)                 #Fixed sizes, nothing measured per cell
+        self.coeff_view.verticalHeader().setDefaultSectionSize(30)
+
+        self.coeff_layout.addWidget(self.coeff_view, 0, 0)
+
+    def load_system(self, A, B):
+        if A.ndim != 2 or B.shape[0] != A.shape[0] or A.size == 0:
+            raise ValueError(f"Expected A as (m, n) and B with m rows, got {A.shape} and {B.shape}")
+
+        self.gridUI(*A.shape)
+        self.coeff_model.set_system(A, B)
+
+    def import_system(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import system", "", SYSTEM_FILES)
+        if not path:
+            return
+
+        try:
+            self.load_system(*read_system(path))
+        except (OSError, ValueError, KeyError) as e:                               #Unreadable file or wrong layout
+            self.progress_label.setText(f"Could not import: {e}")
+            self.progress_label.show()
+
+    def paste_system(self):
+
+        #Clipboard block holds [A | b], last column is the right hand side
+
+        try:
+            M = read_table(QApplication.clipboard().text())
+            self.load_system(M[:, :-1], M[:, -1:])
+        except ValueError as e:
+            self.progress_label.setText(f"Could not paste: {e}")
+            self.progress_label.show()
+
+    def export_solution(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export solution", "", SOLUTION_FILES)
+        if not path:
+            return
+
+        try:
+            write_solution(path, self.x)
+        except OSError as e:
+            self.progress_label.setText(f"Could not export: {e}")
+            self.progress_label.show()
+
+    def copy_solution(self):
+        QApplication.clipboard().setText(format_solution(self.x))
 
     def solver(self):
 
         #Linear Equations Solver Unit
 
-        def safe_float(box):
+        A = self.coeff_model.A().copy()                                             #Form Coefficient Matrix
+        B = self.coeff_model.B().copy()                                             #Form RHS Matrix, edits can go on meanwhile
 
-            #Converts to float and checks for empty entry
+        def job(tracer):
+            return LES(A, B, tracer = tracer).solve()                               #Solve using LES, off the GUI thread
 
-            text = box.text().strip()
-            if not text:
-                return 0.0
-            return float(text)
+        self.start_job(job, self.n_vars, self.solved)
 
-        A = []
-        for row in self.coeff_boxes:
-            A.append([safe_float(coeff_box) for coeff_box in row])                  #Form Coefficient Matrix
+    def solved(self, x):
+        self.x = x
+        self.solutionUI()
 
-        B = [[safe_float(ans_box)] for ans_box in self.ans_boxes]                   #Form RHS Matrix
+    def start_job(self, job, n_cols, on_done):
 
-        try:
-            obj = LES(A, B)                                                         #Solve using LES
-            self.x = obj.solve()
-            self.solutionUI()
-        except ColumnSpaceError:                                                    #Set flag for no solution
+        #Runs job(tracer) on a worker thread, solver and eigen computations both come through here
+
+        if self.worker_thread is not None:
+            return
+
+        self.worker_thread = QThread(self)
+        self.worker = SolveWorker(job, n_cols)
+        self.worker.moveToThread(self.worker_thread)
+
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.job_progress)
+        self.worker.done.connect(on_done)
+        self.worker.failed.connect(self.job_failed)
+        self.worker.cancelled.connect(self.job_cancelled)
+        for signal in (self.worker.done, self.worker.failed, self.worker.cancelled):
+            signal.connect(self.job_finished)
+
+        for button in (self.coeff_submit_button, self.import_button, self.paste_button):  #The result belongs to this system
+            button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.show()
+        self.progress_label.setText("Solving...")
+        self.progress_label.show()
+
+        self.worker_thread.start()
+
+    def job_progress(self, k, n):
+        self.progress_label.setText(f"Pivot {k} of {n}")
+
+    def job_failed(self, error):
+        if isinstance(error, ColumnSpaceError):                                     #Set flag for no solution
             self.solutionUI(cse = True)
+        else:
+            self.progress_label.setText(f"Error: {error}")
+
+    def job_cancelled(self):
+        self.progress_label.setText("Cancelled")
+
+    def job_finished(self, *args):
+
+        #Any outcome, stop the thread and give the controls back
+
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker.deleteLater()
+        self.worker_thread.deleteLater()
+        self.worker = None
+        self.worker_thread = None
+
+        for button in (self.coeff_submit_button, self.import_button, self.paste_button):
+            button.setEnabled(True)
+        self.cancel_button.hide()
+        if self.solution_widgets:
+            self.progress_label.hide()
+
+    def cancel_job(self):
+        if self.worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.worker.cancel()
+
+    def closeEvent(self, event):
+        if self.worker_thread is not None:                                          #Let the elimination stop first
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        super().closeEvent(event)
 
 
     def solutionUI(self, cse = False):
@@ -444,6 +695,8 @@ class MainWindow(QMainWindow):
         self.coeff_submit_button.hide()
         self.coeff_text.hide()
         self.reset_button.show()
+        self.import_button.hide()
+        self.paste_button.hide()
 
         if cse:
             label = QLabel("No solution exists for this system")
@@ -453,6 +706,9 @@ class MainWindow(QMainWindow):
             self.general_v_layout.addWidget(label)
             self.solution_widgets.append(label)
         else:
+            self.export_button.show()
+            self.copy_button.show()
+
             xp = QLabel(f"Particular solution xp = {self.x[0]}")
             xn = QLabel(f"Nullspace basis xn = {self.x[1]}")
             x  = QLabel(f"Complete solution x = {self.x[0]} + c{self.x[1]}")
@@ -480,6 +736,8 @@ class MainWindow(QMainWindow):
 
     def resetUI(self):
 
+        self.progress_label.hide()
+
         self.clear_layout(self.coeff_layout)
 
         for w in self.solution_widgets:
@@ -498,12 +756,13 @@ class MainWindow(QMainWindow):
         self.submit_button.show()
         self.coeff_submit_button.hide()
         self.reset_button.hide()
+        self.import_button.show()
+        self.paste_button.show()
+        self.export_button.hide()
+        self.copy_button.hide()
 
-        self.coeff_boxes = []
-        self.ans_boxes = []
-        self.variable_labels = []
-        self.equals_labels = []
-        self.plus_labels = []
+        self.coeff_model = None
+        self.coeff_view = None
         self.n_eqs = None
         self.n_vars = None
 
@@ -0,0 +1,187 @@
+import heapq
+import numpy as np
+from linear_equations_solver import ColumnSpaceError, _threshold
+
+try:
+    import scipy.sparse as sp
+except ImportError:                                                             #scipy is optional, triplets always work
+    sp = None
+
+class SparseLinearEquationSolver:
+
+    #Sparse counterpart of LinearEquationSolver
+    #A is a scipy.sparse matrix or a (rows, cols, vals, shape) triplet, memory scales with the nonzeros
+
+    def __init__(self, A, B = None, eps=1e-10, tau=0.1):
+        self.shape, self.rows = SparseLinearEquationSolver._to_rows(A)
+        m, n = self.shape
+
+        if B is not None:
+            B = np.array(B, dtype = float)
+            if B.ndim == 1:
+                B = B.reshape(-1, 1)
+            if B.ndim != 2 or B.shape[0] != m:
+                raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+        self.B = B
+
+        self.eps = eps
+        self.tau = tau                                                          #Threshold pivoting, larger is more stable
+
+        self.order = None
+        self.pivots = None
+        self.free_vars = None
+        self.rhs = None
+        self.consistent = None
+
+        self._eliminate()
+
+        if B is not None and B.shape[1] == 1 and not self.consistent[0]:
+            raise ColumnSpaceError(f"No valid solution - B does not exist in C(A)")
+
+    @staticmethod
+    def _to_rows(A):
+
+        #Row-wise dict of keys, duplicates are summed like scipy does
+
+        if sp is not None and sp.issparse(A):
+            A = A.tocoo()
+            r, c, v, shape = A.row, A.col, A.data, A.shape
+        elif isinstance(A, tuple):
+            r, c, v, shape = A
+        else:
+            A = np.asarray(A, dtype = float)
+            r, c = np.nonzero(A)
+            v, shape = A[r, c], A.shape
+
+        rows = [{} for _ in range(shape[0])]
+        for i, j, x in zip(np.asarray(r).tolist(), np.asarray(c).tolist(), np.asarray(v, dtype = float).tolist()):
+            rows[i][j] = rows[i].get(j, 0.0) + x
+
+        return (int(shape[0]), int(shape[1])), rows
+
+    def _eliminate(self):
+
+        #Sparse Gaussian elimination to echelon form with dynamic Markowitz ordering
+        #The next pivot column is the one with the fewest active rows right now (minimum degree, counts
+        #kept current as rows leave and fill appears), its pivot row the shortest one passing the threshold
+
+        m, n = self.shape
+        rows = self.rows
+        rhs = self.B.copy() if self.B is not None else np.zeros((m, 0))
+
+        scale = max((abs(v) for row in rows for v in row.values()), default = 0.0)
+        eps = float(_threshold(self.eps, self.shape, float, scale))             #Pivots and fill relative to max |A|
+
+        col_rows = [set() for _ in range(n)]
+        for i, row in enumerate(rows):
+            for j in row:
+                col_rows[j].add(i)
+
+        heap = [(len(col_rows[j]), j) for j in range(n)]                        #Lazy entries, stale ones are skipped
+        heapq.heapify(heap)
+        done = [False] * n
+        touched = set()
+
+        order = []
+        pivots = []
+
+        while heap:
+            count, col = heapq.heappop(heap)
+            if done[col] or count != len(col_rows[col]):
+                continue
+            done[col] = True
+            order.append(col)
+
+            cand = [i for i in col_rows[col] if abs(rows[i][col]) > eps]
+            if not cand:
+                continue
+
+            amax = max(abs(rows[i][col]) for i in cand)
+            p = min((i for i in cand if abs(rows[i][col]) >= self.tau * amax),
+                    key = lambda i: (len(rows[i]), -abs(rows[i][col])))                 #Shortest row, then the largest entry
+
+            for j in rows[p]:                                                   #Pivot row leaves the active set
+                col_rows[j].discard(p)
+                touched.add(j)
+
+            prow = rows[p]
+            piv = prow[col]
+
+            big = max(abs(v) for v in prow.values())
+            if big > scale:                                                     #Roundoff grows with the pivot rows
+                scale = big
+                eps = float(_threshold(self.eps, self.shape, float, scale))
+
+            for i in list(col_rows[col]):
+                row = rows[i]
+                l = row[col] / piv
+
+                for j, v in prow.items():
+                    x = row.get(j, 0.0) - l * v
+                    if j == col or abs(x) < eps:
+                        if j in row:
+                            del row[j]
+                            col_rows[j].discard(i)
+                            touched.add(j)
+                    else:
+                        if j not in row:
+                            col_rows[j].add(i)
+                            touched.add(j)
+                        row[j] = x
+
+                rhs[i] -= l * rhs[p]
+
+            for j in touched:                                                   #Degree update for every changed column
+                if not done[j]:
+                    heapq.heappush(heap, (len(col_rows[j]), j))
+            touched.clear()
+
+            pivots.append((p, col))
+
+        pivot_rows = set(p for p, _ in pivots)
+        zero_rows = [i for i in range(m) if i not in pivot_rows]
+
+        self.order = order
+        self.pivots = pivots
+        self.free_vars = sorted(set(range(n)) - set(col for _, col in pivots))
+        self.rhs = rhs
+        rhs_max = float(np.max(np.abs(rhs))) if rhs.size else 0.0
+        tol = _threshold(self.eps, self.shape, float, max(scale, rhs_max))
+        self.consistent = ~np.any(np.abs(rhs[zero_rows]) > tol, axis = 0)
+
+    def _back(self, x, rhs):
+
+        #Back substitution in reverse pivot order, x holds the free variables on entry
+
+        for p, col in reversed(self.pivots):
+            row = self.rows[p]
+            acc = rhs[p].copy()
+            for j, v in row.items():
+                if j != col:
+                    acc -= v * x[j]
+            x[col] = acc / row[col]
+
+        return x
+
+    def _find_nullspace(self):
+        m, n = self.shape
+        free = self.free_vars
+
+        N = np.zeros((n, len(free)))
+        N[free, np.arange(len(free))] = 1
+
+        return self._back(N, np.zeros((m, len(free))))
+
+    def solve(self):
+        n = self.shape[1]
+
+        if self.B is None:
+            x_p = np.zeros((n, 1))
+        else:
+            x_p = self._back(np.zeros((n, self.rhs.shape[1])), self.rhs)
+            x_p[:, ~self.consistent] = np.nan
+
+        if len(self.free_vars) == 0:
+            return x_p, 0
+
+        return x_p, self._find_nullspace()
@@ -0,0 +1,90 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+#Opt-in instrumentation for LinearEquationSolver
+#One SolverStats can be shared by many solvers, every number is a running total
+
+PHASES = ["_augment_matrix", "_rref", "_check_colspace", "_soln_extract", "_find_nullspace", "_orthogonal"]
+
+COUNTERS = ["solves", "pivots", "row_swaps", "row_ops", "rejected_pivots", "bytes_allocated"]
+
+class SolverStats:
+
+    #Phase times are inclusive, _check_colspace contains the _rref it triggers
+    #Also implements the tracer interface, so the engines count pivots and row operations into it
+
+    def __init__(self):
+        self.seconds = {name: 0.0 for name in PHASES}
+        self.calls = {name: 0 for name in PHASES}
+        self.counters = {name: 0 for name in COUNTERS}
+
+    @contextmanager
+    def phase(self, name):
+        t = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - t
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def allocated(self, *arrays):
+        self.counters["bytes_allocated"] += sum(a.nbytes for a in arrays if hasattr(a, "nbytes"))
+
+    def pivot(self, row, col, value, M = None):
+        self.counters["pivots"] += 1
+
+    def swap(self, row, other, M = None):
+        self.counters["row_swaps"] += 1
+        self.counters["row_ops"] += 1
+
+    def scale(self, row, factor, M = None):
+        self.counters["row_ops"] += 1
+
+    def eliminate(self, row, col, M = None):
+        self.counters["row_ops"] += max(len(M) - 1, 0) if M is not None else 1    #One update per other row
+
+    def skip(self, col, M = None):
+        self.counters["rejected_pivots"] += 1
+
+    def reset(self):
+        self.__init__()
+
+    def as_dict(self):
+        return {
+            "seconds": dict(self.seconds),
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+        }
+
+    def to_prometheus(self, prefix = "les"):
+
+        #Prometheus text exposition format, counters only
+
+        lines = [f"# TYPE {prefix}_phase_seconds_total counter"]
+        lines += [f'{prefix}_phase_seconds_total{{phase="{k}"}} {v:.9f}' for k, v in self.seconds.items()]
+        lines.append(f"# TYPE {prefix}_phase_calls_total counter")
+        lines += [f'{prefix}_phase_calls_total{{phase="{k}"}} {v}' for k, v in self.calls.items()]
+        for k, v in self.counters.items():
+            lines.append(f"# TYPE {prefix}_{k}_total counter")
+            lines.append(f"{prefix}_{k}_total {v}")
+
+        return "\n".join(lines) + "\n"
+
+def timed(method):
+
+    #Times a solver method into self.stats under its own name, a plain call when stats is None
+
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.stats is None:
+            return method(self, *args, **kwargs)
+        with self.stats.phase(name):
+            return method(self, *args, **kwargs)
+
+    return wrapper
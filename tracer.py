@@ -0,0 +1,148 @@
+import numpy as np
+from array import array
+
+#Step tracing for the elimination engines
+#Events go into flat typed arrays, nothing is formatted until the log is read
+
+PIVOT = 0
+SWAP = 1
+SCALE = 2
+ELIMINATE = 3
+SKIP = 4
+
+NAMES = {PIVOT: "pivot", SWAP: "swap", SCALE: "scale", ELIMINATE: "eliminate", SKIP: "skip"}
+
+class StepTracer:
+
+    #Attach to LinearEquationSolver(tracer=...) to record every row operation
+    #snapshots=True also keeps a copy of the matrix after each step, for replaying in a front end
+
+    def __init__(self, snapshots = False):
+        self.kinds = array("b")
+        self.rows = array("l")
+        self.cols = array("l")                                                  #Column, or second row for a swap
+        self.values = array("d")
+        self.snapshots = [] if snapshots else None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def _record(self, kind, row, col, value, M):
+        self.kinds.append(kind)
+        self.rows.append(row)
+        self.cols.append(col)
+        self.values.append(value)
+        if self.snapshots is not None:
+            self.snapshots.append(None if M is None else np.array(M))
+
+    def pivot(self, row, col, value, M = None):
+        self._record(PIVOT, row, col, float(value), M)
+
+    def swap(self, row, other, M = None):
+        self._record(SWAP, row, other, 0.0, M)
+
+    def scale(self, row, factor, M = None):
+        self._record(SCALE, row, -1, float(factor), M)
+
+    def eliminate(self, row, col, M = None):
+
+        #Every other row minus a multiple of the pivot row, one vectorized update
+
+        self._record(ELIMINATE, row, col, 0.0, M)
+
+    def skip(self, col, M = None):
+        self._record(SKIP, -1, col, 0.0, M)
+
+    def events(self):
+
+        #(name, row, col, value) per step, built only when asked for
+
+        for k, r, c, v in zip(self.kinds, self.rows, self.cols, self.values):
+            yield NAMES[k], r, c, v
+
+    def format(self):
+        lines = []
+        for i, (name, r, c, v) in enumerate(self.events()):
+            if name == "pivot":
+                line = f"Pivot is {v} in row {r + 1}, column {c + 1}"
+            elif name == "swap":
+                line = f"Swapping rows {r + 1} and {c + 1}"
+            elif name == "scale":
+                line = f"Row {r + 1} divided by {v}"
+            elif name == "eliminate":
+                line = f"Column {c + 1} cleared using row {r + 1}"
+            else:
+                line = f"No valid pivot in column {c + 1}, continuing"
+
+            if self.snapshots is not None and self.snapshots[i] is not None:
+                line += f"\nR is \n{self.snapshots[i]}"
+            lines.append(line)
+
+        return "\n".join(lines)
+
+class TeeTracer:
+
+    #Forwards every event to several tracers, e.g. a StepTracer and a SolverStats
+
+    def __init__(self, *tracers):
+        self.tracers = tracers
+
+    def pivot(self, row, col, value, M = None):
+        for t in self.tracers:
+            t.pivot(row, col, value, M)
+
+    def swap(self, row, other, M = None):
+        for t in self.tracers:
+            t.swap(row, other, M)
+
+    def scale(self, row, factor, M = None):
+        for t in self.tracers:
+            t.scale(row, factor, M)
+
+    def eliminate(self, row, col, M = None):
+        for t in self.tracers:
+            t.eliminate(row, col, M)
+
+    def skip(self, col, M = None):
+        for t in self.tracers:
+            t.skip(col, M)
+
+class SolveCancelled(Exception):
+    pass
+
+class ProgressTracer:
+
+    #Reports each column the engine reaches through callback(col + 1, n_cols)
+    #cancel() can be called from another thread, the next event raises SolveCancelled inside the engine
+
+    def __init__(self, n_cols, callback = None):
+        self.n_cols = n_cols
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _check(self):
+        if self.cancelled:
+            raise SolveCancelled("Elimination cancelled")
+
+    def _step(self, col):
+        self._check()
+        if self.callback is not None:
+            self.callback(col + 1, self.n_cols)
+
+    def pivot(self, row, col, value, M = None):
+        self._step(col)
+
+    def swap(self, row, other, M = None):
+        self._check()
+
+    def scale(self, row, factor, M = None):
+        self._check()
+
+    def eliminate(self, row, col, M = None):
+        self._check()
+
+    def skip(self, col, M = None):
+        self._step(col)